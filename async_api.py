@@ -0,0 +1,233 @@
+"""Asyncio JSON API for the high-frequency location and presence endpoints.
+
+Serves /api/friend-locations and /api/update-location exactly as routes/location.py does,
+plus the /api/presence heartbeat and friend-presence poll. It runs on SQLAlchemy's asyncio
+engine, so a map client sitting on these endpoints costs a coroutine instead of a worker.
+Models, privacy projections, rate limits and the Flask session cookie are shared with the
+Flask app. It runs as its own ASGI process next to gunicorn:
+
+    uvicorn async_api:create_asgi_app --factory --port 5001
+
+and the proxy routes the paths in ROUTES to it. The Flask routes stay in place for
+deployments without it. Location pushes reach Socket.IO clients through
+SOCKETIO_MESSAGE_QUEUE; without a queue there is no way to reach them and they are skipped.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from itsdangerous import BadSignature
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app import create_app
+from database import db, async_database_url, async_engine_options
+from models import User, friend_connection
+import candidates
+import rate_limit
+import serializers
+
+logger = logging.getLogger(__name__)
+
+ROUTES = {
+    ('GET', '/api/friend-locations'): 'friend_locations',
+    ('POST', '/api/update-location'): 'update_location',
+    ('GET', '/api/presence'): 'friend_presence',
+    ('POST', '/api/presence'): 'heartbeat',
+}
+
+
+def _utcnow():
+    """Now as naive UTC, the form the DateTime columns store"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body, headers=()):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+
+class AsyncAPI:
+    """ASGI application serving ROUTES for the user in the Flask session cookie"""
+
+    def __init__(self, flask_app):
+        config = flask_app.config
+        with flask_app.app_context():
+            # The bound engine's URL, so relative SQLite paths resolve as they do for Flask
+            url = db.engine.url.render_as_string(hide_password=False)
+        self.engine = create_async_engine(async_database_url(url), **async_engine_options(config))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        self.cookie_name = config['SESSION_COOKIE_NAME']
+        self.session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.rate_limits = flask_app.extensions['rate_limit']
+        self.online_window = timedelta(seconds=config['PRESENCE_ONLINE_SECONDS'])
+
+        self.emitter = None
+        if config['SOCKETIO_MESSAGE_QUEUE']:
+            from flask_socketio import SocketIO
+            # Write-only client of the queue the Socket.IO workers listen on
+            self.emitter = SocketIO(message_queue=config['SOCKETIO_MESSAGE_QUEUE'])
+        else:
+            logger.warning("SOCKETIO_MESSAGE_QUEUE is not set; location updates will not be pushed")
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        try:
+            name = ROUTES.get((scope['method'], scope['path']))
+            if name is None:
+                raise HTTPError(404, {'error': 'Not found'})
+            user_id = self.session_user_id(scope)
+            if user_id is None:
+                raise HTTPError(401, {'error': 'Login required'})
+            body = await self.read_json(receive) if scope['method'] == 'POST' else None
+            status, payload, headers = 200, await getattr(self, name)(user_id, body), ()
+        except HTTPError as error:
+            status, payload, headers = error.status, error.body, error.headers
+        except Exception:
+            logger.exception("Async API error on %s", scope['path'])
+            status, payload, headers = 500, {'error': 'Internal server error'}, ()
+
+        content = serializers.dumps(payload)
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(content)).encode()),
+                        *headers],
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session_user_id(self, scope):
+        """The Flask-Login user id in the request's session cookie, or None"""
+        cookie = None
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                for part in value.decode('latin-1').split(';'):
+                    key, _, morsel = part.strip().partition('=')
+                    if key == self.cookie_name:
+                        cookie = morsel
+        if not cookie:
+            return None
+        try:
+            session = self.session_serializer.loads(cookie, max_age=self.session_max_age)
+        except BadSignature:
+            return None
+        user_id = session.get('_user_id')
+        return int(user_id) if user_id is not None else None
+
+    async def read_json(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        try:
+            return serializers.loads(b''.join(chunks) or b'{}')
+        except ValueError:
+            raise HTTPError(400, {'success': False, 'error': 'Invalid JSON'}) from None
+
+    def friends_query(self, user_id, columns):
+        return db.select(*[getattr(User, name) for name in columns]).join(
+            friend_connection, friend_connection.c.friend_id == User.id
+        ).where(friend_connection.c.user_id == user_id)
+
+    async def friend_locations(self, user_id, body):
+        async with self.sessions() as session:
+            friends = await session.execute(self.friends_query(user_id, User.SUMMARY_COLUMNS))
+        friend_data = []
+        for friend in friends:
+            view = serializers.project(friend, serializers.FRIEND, serializers.MAP_FIELDS)
+            # Friends who hide their location don't appear on the map
+            if view.get('latitude') and view.get('longitude'):
+                friend_data.append(view)
+        return friend_data
+
+    async def update_location(self, user_id, body):
+        refused = await self.take_token('update_location', user_id)
+        if refused:
+            scope, retry_after = refused
+            raise HTTPError(429, rate_limit.slow_down('update_location', scope, retry_after),
+                            [(b'retry-after', str(max(1, round(retry_after))).encode())])
+        try:
+            latitude = float(body.get('latitude'))
+            longitude = float(body.get('longitude'))
+        except (AttributeError, TypeError, ValueError) as e:
+            raise HTTPError(400, {'success': False, 'error': str(e)}) from None
+
+        async with self.sessions() as session:
+            # One UPDATE returns the columns the friends' map projection needs
+            user = (await session.execute(
+                db.update(User).where(User.id == user_id).values(
+                    latitude=latitude, longitude=longitude, last_active=_utcnow(),
+                    geo_cell=candidates.geo_cell(latitude, longitude)
+                ).returning(*[getattr(User, name) for name in User.SUMMARY_COLUMNS])
+            )).one_or_none()
+            if user is None:
+                raise HTTPError(401, {'error': 'Login required'})
+            friend_ids = (await session.execute(
+                db.select(friend_connection.c.friend_id).where(friend_connection.c.user_id == user_id)
+            )).scalars().all()
+            await session.commit()
+
+        location_data = serializers.project(user, serializers.FRIEND, serializers.MAP_FIELDS)
+        if self.emitter is not None and 'latitude' in location_data.fields:
+            await asyncio.to_thread(self.push_location, friend_ids, location_data.as_dict())
+        return {'success': True}
+
+    def push_location(self, friend_ids, location_data):
+        for friend_id in friend_ids:
+            self.emitter.emit('friend_location_update', location_data, room=f'user_{friend_id}')
+
+    async def heartbeat(self, user_id, body):
+        async with self.sessions() as session:
+            await session.execute(
+                db.update(User).where(User.id == user_id).values(last_active=_utcnow())
+            )
+            await session.commit()
+        return {'success': True}
+
+    async def friend_presence(self, user_id, body):
+        """Online state of each friend whose privacy settings share their last activity"""
+        async with self.sessions() as session:
+            friends = await session.execute(self.friends_query(user_id, ('id', 'last_active', 'privacy_mask')))
+        online_since = datetime.now(timezone.utc) - self.online_window
+        presence = []
+        for friend in friends:
+            view = serializers.project(friend, serializers.FRIEND, ('id', 'last_active'))
+            last_active = view.get('last_active')
+            if last_active is None:
+                continue
+            if last_active.tzinfo is None:
+                last_active = last_active.replace(tzinfo=timezone.utc)
+            presence.append({'id': friend.id, 'online': last_active >= online_since,
+                             'last_active': last_active})
+        return presence
+
+    async def take_token(self, name, user_id):
+        backend = self.rate_limits['backend']
+        if isinstance(backend, rate_limit.LocalBackend):
+            return rate_limit.take(self.rate_limits, name, user_id=user_id)
+        # Shared backends do network I/O
+        return await asyncio.to_thread(rate_limit.take, self.rate_limits, name, user_id)
+
+
+def create_asgi_app(config=None):
+    """ASGI app for ROUTES, configured like create_app(config)"""
+    return AsyncAPI(create_app(config))
@@ -0,0 +1,177 @@
+"""Benchmark the hot paths against a synthetic social graph.
+
+    python -m benchmarks.run --database sqlite:///bench.db --scales 200,2000 --output bench.json
+    python -m benchmarks.run --database postgresql://localhost/friend_finder_bench
+
+The database is dropped and rebuilt for every scale, so never point this at real data.
+Results are written as JSON so runs on different commits can be compared.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+
+def _summary(samples, queries=None):
+    ordered = sorted(samples)
+    stats = {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+    }
+    if queries:
+        stats['queries_mean'] = round(statistics.fmean(queries), 1)
+    return stats
+
+
+def _queries_from_header(response):
+    # X-SQL-Stats looks like "queries=12; db_ms=3.4; repeated_shapes=1"
+    header = response.headers.get('X-SQL-Stats', '')
+    for part in header.split(';'):
+        key, _, value = part.strip().partition('=')
+        if key == 'queries':
+            return int(value)
+    return None
+
+
+def _time_http(client, method, paths, json_bodies=None):
+    samples, queries = [], []
+    for index, path in enumerate(paths):
+        started = time.perf_counter()
+        if method == 'POST':
+            response = client.post(path, json=json_bodies[index])
+        else:
+            response = client.get(path)
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        count = _queries_from_header(response)
+        if count is not None:
+            queries.append(count)
+    return _summary(samples, queries)
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def run_scale(app, db, socketio, num_users, runs, seed):
+    from models import User, Message, friend_connection
+    from benchmarks.social_graph import generate
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        graph = generate(num_users, seed=seed)
+        generation_seconds = time.perf_counter() - started
+
+        # Sample users who have at least one friend and one conversation
+        chatty = db.session.execute(
+            db.select(Message.sender_id, Message.recipient_id).distinct().limit(runs * 4)
+        ).all()
+        pairs = [rng.choice(chatty) for _ in range(runs)] if chatty else []
+        with_friends = [row[0] for row in db.session.execute(
+            db.select(friend_connection.c.user_id).distinct().limit(runs * 4))]
+        sample_users = [rng.choice(with_friends) for _ in range(runs)]
+
+        results = {}
+
+        samples = []
+        for user_id in sample_users:
+            db.session.expunge_all()
+            user = db.session.get(User, user_id)
+            started = time.perf_counter()
+            user.get_friend_suggestions(limit=10)
+            samples.append(time.perf_counter() - started)
+        results['get_friend_suggestions'] = _summary(samples)
+
+    client = app.test_client()
+    _login(client, pairs[0][0] if pairs else sample_users[0])
+
+    if pairs:
+        results['GET /chat'] = _time_http(client, 'GET', [f'/chat/{pairs[i % len(pairs)][1]}' for i in range(runs)])
+    results['GET /messages'] = _time_http(client, 'GET', ['/messages'] * runs)
+    results['GET /api/friend-locations'] = _time_http(client, 'GET', ['/api/friend-locations'] * runs)
+    results['POST /api/update-location'] = _time_http(
+        client, 'POST', ['/api/update-location'] * runs,
+        [{'latitude': 40.7 + rng.random() / 10, 'longitude': -74.0 + rng.random() / 10} for _ in range(runs)]
+    )
+
+    # Socket.IO message throughput through the real handler, including commit and emits
+    if pairs:
+        sender, recipient = pairs[0]
+        _login(client, sender)
+        socket_client = socketio.test_client(app, flask_test_client=client)
+        count = runs * 10
+        started = time.perf_counter()
+        for index in range(count):
+            socket_client.emit('send_message', {'recipient_id': recipient, 'content': f'benchmark {index}'})
+        elapsed = time.perf_counter() - started
+        socket_client.disconnect()
+        results['socket send_message'] = {
+            'messages': count,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(count / elapsed, 1) if elapsed else None,
+        }
+
+    return {'graph': graph, 'generation_seconds': round(generation_seconds, 3), 'results': results}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='sqlite:///benchmark.db', help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--scales', default='100,1000', help='Comma-separated user counts')
+    parser.add_argument('--runs', type=int, default=20, help='Timed runs per operation')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write JSON results here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from database import db
+    from extensions import socketio
+    # Rate limits off: the scenarios deliberately exceed them and a 429 would abort the run
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database, 'SQL_DEBUG_HEADER': True, 'LOG_LEVEL': 'WARNING',
+                      'RATE_LIMITS': '', 'RATE_LIMITS_PER_USER': ''})
+
+    report = {
+        'commit': _git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'database': args.database.split(':', 1)[0],
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'seed': args.seed,
+        'scales': {}
+    }
+    for scale in (int(value) for value in args.scales.split(',')):
+        print(f"Benchmarking {scale} users...", file=sys.stderr)
+        report['scales'][str(scale)] = run_scale(app, db, socketio, scale, args.runs, args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
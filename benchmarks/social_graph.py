@@ -0,0 +1,165 @@
+"""Synthetic social graph generator for the benchmark suite.
+
+Builds users clustered around a handful of city centres, with interests and activities
+drawn from skewed vocabularies, a friend graph that prefers same-city friends, direct
+message histories between friends, and chat groups. The same seed always produces the
+same graph.
+"""
+import random
+from datetime import datetime, timezone, timedelta
+from werkzeug.security import generate_password_hash
+from database import db
+import candidates
+from models import User, FriendRequest, Message, ChatGroup, GroupMessage, friend_connection, group_membership
+
+CITIES = [
+    (40.7128, -74.0060),   # New York
+    (51.5074, -0.1278),    # London
+    (48.8566, 2.3522),     # Paris
+    (35.6762, 139.6503),   # Tokyo
+    (-33.8688, 151.2093),  # Sydney
+    (37.7749, -122.4194),  # San Francisco
+    (52.5200, 13.4050),    # Berlin
+    (19.4326, -99.1332),   # Mexico City
+]
+INTERESTS = ['hiking', 'music', 'reading', 'gaming', 'cooking', 'travel', 'photography', 'art',
+             'movies', 'fitness', 'yoga', 'coding', 'dancing', 'gardening', 'chess', 'fashion',
+             'history', 'languages', 'science', 'writing']
+ACTIVITIES = ['running', 'climbing', 'cycling', 'swimming', 'board games', 'concerts', 'museums',
+              'coffee', 'tennis', 'football', 'basketball', 'karaoke', 'volunteering', 'camping']
+LOOKING_FOR = ['friendship', 'activity_partner', 'study_buddy', 'networking']
+AVAILABILITY = ['weekdays', 'weekends', 'evenings', 'flexible']
+WORDS = ['hey', 'how', 'are', 'you', 'doing', 'today', 'want', 'to', 'grab', 'coffee', 'later',
+         'sounds', 'great', 'see', 'you', 'there', 'what', 'time', 'works', 'for', 'me']
+
+BATCH = 5000
+
+
+def _skewed_sample(rng, vocabulary, k):
+    # Earlier words are more popular, roughly Zipf-shaped
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    chosen = set()
+    while len(chosen) < k:
+        chosen.add(rng.choices(vocabulary, weights)[0])
+    return ','.join(sorted(chosen))
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(table.insert(), rows[start:start + BATCH])
+
+
+def generate(num_users, seed=42, avg_friends=12, messages_per_pair=20, chatty_fraction=0.3,
+             group_size=8, messages_per_group=50, pending_requests_per_user=2):
+    """Populate the current database and return a summary of what was created.
+
+    Expects empty tables; timestamps span the last 90 days.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    password_hash = generate_password_hash('benchmark-password')
+
+    users = []
+    city_of = {}
+    for user_id in range(1, num_users + 1):
+        city = rng.randrange(len(CITIES))
+        lat, lon = CITIES[city]
+        city_of[user_id] = city
+        latitude, longitude, age = rng.gauss(lat, 0.15), rng.gauss(lon, 0.15), rng.randint(18, 70)
+        users.append({
+            'id': user_id,
+            'username': f'user{user_id}',
+            'email': f'user{user_id}@example.com',
+            'password_hash': password_hash,
+            'latitude': latitude,
+            'longitude': longitude,
+            'age': age,
+            **candidates.segment(age, latitude, longitude),
+            'looking_for': rng.choice(LOOKING_FOR),
+            'availability': rng.choice(AVAILABILITY),
+            'interests': _skewed_sample(rng, INTERESTS, rng.randint(2, 6)),
+            'activities': _skewed_sample(rng, ACTIVITIES, rng.randint(1, 4)),
+            'bio': ' '.join(rng.choices(WORDS, k=60)),
+            'location': f'City {city}',
+            'privacy_settings': {'location_visible': True, 'interests_visible': True, 'bio_visible': True,
+                                 'age_visible': True, 'activities_visible': True, 'availability_visible': True},
+            'last_active': now - timedelta(minutes=rng.randint(0, 60 * 24 * 7)),
+            'unread_notifications': 0,
+        })
+    _insert(User.__table__, users)
+
+    by_city = {}
+    for user_id, city in city_of.items():
+        by_city.setdefault(city, []).append(user_id)
+
+    # Friend graph: mostly same-city edges, stored in both directions like add_friend does
+    pairs = set()
+    for user_id in range(1, num_users + 1):
+        for _ in range(max(1, int(rng.expovariate(1 / avg_friends) / 2))):
+            pool = by_city[city_of[user_id]] if rng.random() < 0.8 else range(1, num_users + 1)
+            other = rng.choice(pool)
+            if other != user_id:
+                pairs.add((min(user_id, other), max(user_id, other)))
+    _insert(friend_connection, [{'user_id': a, 'friend_id': b} for a, b in pairs] +
+            [{'user_id': b, 'friend_id': a} for a, b in pairs])
+
+    messages = []
+    for a, b in pairs:
+        if rng.random() >= chatty_fraction:
+            continue
+        sent_at = now - timedelta(days=90)
+        for _ in range(rng.randint(1, messages_per_pair * 2)):
+            sent_at += timedelta(seconds=rng.randint(30, 6 * 3600))
+            sender, recipient = (a, b) if rng.random() < 0.5 else (b, a)
+            messages.append({
+                'sender_id': sender,
+                'recipient_id': recipient,
+                'content': ' '.join(rng.choices(WORDS, k=rng.randint(2, 12))),
+                'is_read': sent_at < now - timedelta(days=1),
+                'created_at': min(sent_at, now),
+            })
+    _insert(Message.__table__, messages)
+
+    requests = set()
+    for user_id in range(1, num_users + 1):
+        for _ in range(pending_requests_per_user):
+            other = rng.randint(1, num_users)
+            pair = (min(user_id, other), max(user_id, other))
+            if other != user_id and pair not in pairs:
+                requests.add((other, user_id))
+    _insert(FriendRequest.__table__, [
+        {'sender_id': sender, 'receiver_id': receiver, 'status': 'pending', 'created_at': now}
+        for sender, receiver in requests
+    ])
+
+    groups, memberships, group_messages = [], [], []
+    for group_id in range(1, max(1, num_users // group_size) + 1):
+        city_users = by_city[rng.randrange(len(CITIES))]
+        members = rng.sample(city_users, min(group_size, len(city_users)))
+        groups.append({'id': group_id, 'name': f'Group {group_id}', 'created_by': members[0],
+                       'created_at': now - timedelta(days=90)})
+        memberships.extend({'user_id': member, 'group_id': group_id} for member in members)
+        sent_at = now - timedelta(days=30)
+        groups[-1]['last_seq'] = messages_per_group
+        for seq in range(1, messages_per_group + 1):
+            sent_at += timedelta(seconds=rng.randint(60, 12 * 3600))
+            group_messages.append({
+                'group_id': group_id,
+                'seq': seq,
+                'sender_id': rng.choice(members),
+                'content': ' '.join(rng.choices(WORDS, k=rng.randint(2, 12))),
+                'created_at': min(sent_at, now),
+            })
+    _insert(ChatGroup.__table__, groups)
+    _insert(group_membership, memberships)
+    _insert(GroupMessage.__table__, group_messages)
+
+    db.session.commit()
+    return {
+        'users': num_users,
+        'friendships': len(pairs),
+        'messages': len(messages),
+        'friend_requests': len(requests),
+        'groups': len(groups),
+        'group_messages': len(group_messages),
+    }
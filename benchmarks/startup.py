@@ -0,0 +1,74 @@
+"""Measure how long the app takes to import and to become ready to serve.
+
+    python -m benchmarks.startup --runs 10 --output startup.json
+
+Each run starts a fresh interpreter so nothing is cached between samples. "import" is the
+time to import the app module; "ready" adds building the app with create_app(), which is
+what a gunicorn worker pays before it can accept requests. Trees from before the app
+factory build the app at import time, so there the two numbers are the same. Optional
+heavy modules that ended up loaded are reported so lazy imports can be checked too.
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+from benchmarks.run import _git_commit
+
+HEAVY_MODULES = ('PIL', 'flask_mail', 'oauthlib', 'jwt')
+
+PROBE = '''
+import sys, json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if hasattr(app, 'create_app'):
+    app.create_app()
+ready = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'ready_s': ready - started,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+'''
+
+
+def _probe(database):
+    env = {**os.environ, 'DATABASE_URL': database}
+    output = subprocess.check_output([sys.executable, '-c', PROBE % (HEAVY_MODULES,)], text=True,
+                                     stderr=subprocess.DEVNULL, env=env)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='sqlite:///benchmark.db', help='SQLAlchemy URL (not connected to)')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters to sample')
+    parser.add_argument('--output', help='Write JSON results here (default: stdout)')
+    args = parser.parse_args(argv)
+
+    samples = [_probe(args.database) for _ in range(args.runs)]
+    report = {
+        'commit': _git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'import_ms': round(statistics.median(s['import_s'] for s in samples) * 1000, 1),
+        'ready_ms': round(statistics.median(s['ready_s'] for s in samples) * 1000, 1),
+        'heavy_modules_loaded': samples[-1]['loaded'],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
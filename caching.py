@@ -0,0 +1,249 @@
+"""Bounded in-process caches for read-mostly data, invalidated across workers.
+
+Each named Store is an LRU of at most CACHE_MAX_ENTRIES entries, each expiring after the
+store's TTL. Use the @cached(name, ttl) decorator for functions of hashable arguments, or
+store()/get()/put() directly. After a write, call invalidate(name, *keys): the keys are
+dropped when the transaction commits, here and, through the invalidation bus, in every
+other worker. The bus is Redis pub/sub when CACHE_INVALIDATION_URL is set and a local
+stand-in otherwise; either way the TTL bounds how long a missed invalidation can last.
+Each worker must call start_listener() after it forks (gunicorn.conf.py post_fork).
+"""
+import json
+import time
+import uuid
+import logging
+import threading
+import functools
+from collections import OrderedDict
+from sqlalchemy import event
+from database import db, RoutingSession
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+MISSING = object()
+
+
+class Store:
+    """LRU of (expiry, value) entries bounded by entry count"""
+
+    def __init__(self, name, ttl=DEFAULT_TTL, max_entries=10000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # Bumped by every delete so a load that raced with an invalidation is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, ttl=None, generation=None):
+        """Store value; skipped when generation is given and an invalidation happened since"""
+        if not self.max_entries:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class LocalBus:
+    """Stand-in for a single worker: invalidations are applied locally, nothing to send"""
+
+    def publish(self, name, keys):
+        pass
+
+    def start(self, apply):
+        pass
+
+
+class RedisBus:
+    """Invalidations published on a Redis channel and applied by a listener in each worker"""
+
+    CHANNEL = 'cache-invalidation'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_INVALIDATION_URL needs the redis package installed') from None
+        self.client = redis.Redis.from_url(url)
+        # Our own messages come back on the channel; they are already applied
+        self.origin = uuid.uuid4().hex
+
+    def publish(self, name, keys):
+        message = {'origin': self.origin, 'store': name, 'keys': None if keys is None else list(keys)}
+        try:
+            self.client.publish(self.CHANNEL, json.dumps(message))
+        except Exception:
+            logger.exception("Cache invalidation for %s could not be published", name)
+
+    def start(self, apply):
+        # The bus is built before gunicorn forks, so each worker takes its own origin here
+        self.origin = uuid.uuid4().hex
+
+        def listen():
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.CHANNEL)
+                    for message in pubsub.listen():
+                        data = json.loads(message['data'])
+                        if data['origin'] != self.origin:
+                            keys = data['keys']
+                            # JSON turns tuple keys into lists
+                            apply(data['store'], None if keys is None else
+                                  [tuple(key) if isinstance(key, list) else key for key in keys])
+                except Exception:
+                    logger.exception("Cache invalidation listener failed; reconnecting")
+                    time.sleep(1)
+
+        threading.Thread(target=listen, name='cache-invalidation', daemon=True).start()
+
+
+stores = {}
+bus = LocalBus()
+_max_entries = 10000
+
+
+def store(name, ttl=DEFAULT_TTL):
+    """The named store, created on first use"""
+    if name not in stores:
+        stores[name] = Store(name, ttl, _max_entries)
+    return stores[name]
+
+
+def get(name, key, default=None):
+    value = store(name).get(key)
+    return default if value is MISSING else value
+
+
+def put(name, key, value, ttl=None):
+    store(name).put(key, value, ttl)
+
+
+def _apply(name, keys):
+    target = stores.get(name)
+    if target is None:
+        return
+    if keys is None:
+        target.clear()
+    else:
+        target.delete(*keys)
+
+
+def invalidate(name, *keys, session=None):
+    """Drop keys from the named store everywhere once the (current) session commits"""
+    (session or db.session).info.setdefault('cache_invalidations', {}).setdefault(name, set()).update(keys)
+
+
+def invalidate_now(name, *keys):
+    """invalidate() outside a transaction; no keys clears the whole store"""
+    _apply(name, keys or None)
+    bus.publish(name, keys or None)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _publish_invalidations(session):
+    for name, keys in session.info.pop('cache_invalidations', {}).items():
+        _apply(name, keys)
+        bus.publish(name, keys)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_invalidations(session):
+    session.info.pop('cache_invalidations', None)
+
+
+def cached(name, ttl=DEFAULT_TTL):
+    """Cache a function's results in the named store, keyed by its positional arguments.
+
+    None results are not cached. wrapper.invalidate(*args) invalidates one call's entry.
+    """
+    def key_of(args):
+        return args[0] if len(args) == 1 else args
+
+    def decorator(function):
+        target = store(name, ttl)
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            key = key_of(args)
+            value = target.get(key)
+            if value is not MISSING:
+                return value
+            generation = target.generation
+            value = function(*args)
+            if value is not None:
+                target.put(key, value, generation=generation)
+            return value
+
+        wrapper.invalidate = lambda *args: invalidate(name, key_of(args))
+        wrapper.store = target
+        return wrapper
+    return decorator
+
+
+def start_listener():
+    """Apply invalidations from other workers; call once in each worker process"""
+    bus.start(_apply)
+
+
+def init_app(app):
+    global bus, _max_entries
+    _max_entries = app.config['CACHE_MAX_ENTRIES']
+    for target in stores.values():
+        target.max_entries = _max_entries
+        target.clear()
+    url = app.config['CACHE_INVALIDATION_URL']
+    bus = RedisBus(url) if url else LocalBus()
+    metrics.registry.register(metrics.Gauge(
+        'cache', 'Shared in-process cache state',
+        lambda: {(name, stat): value for name, target in stores.items()
+                 for stat, value in target.stats().items()},
+        labels=('store', 'stat')
+    ))
@@ -0,0 +1,96 @@
+"""Segmented candidate selection for friend suggestions.
+
+Every user is filed under a segment (looking_for, availability, age bucket, geo cell);
+User.age_bucket and User.geo_cell are kept current by User.update_segment() whenever the
+profile or location is saved, and ix_user_candidate_segment indexes the four columns.
+Suggestions read candidates from the segments compatible with the viewer first and widen
+one dimension at a time (distance, then age, then availability, then purpose) while too
+few are found, never loading more than SUGGESTION_CANDIDATES users in total.
+"""
+import math
+from flask import current_app
+
+AGE_BUCKET_YEARS = 10
+# About 111 km of latitude, the distance beyond which location adds nothing to the score
+GEO_CELL_DEGREES = 1.0
+# Availability that counts as overlapping with every other
+FLEXIBLE = 'flexible'
+# Keep widening until there are this many candidates per suggestion wanted
+CANDIDATES_PER_SUGGESTION = 5
+
+
+def age_bucket(age):
+    return age // AGE_BUCKET_YEARS if age is not None else None
+
+
+def _cell_index(latitude, longitude):
+    return math.floor(latitude / GEO_CELL_DEGREES), math.floor(longitude / GEO_CELL_DEGREES)
+
+
+def geo_cell(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return '%d:%d' % _cell_index(latitude, longitude)
+
+
+def segment(age, latitude, longitude):
+    """Column values filing a user under their segment"""
+    return {'age_bucket': age_bucket(age), 'geo_cell': geo_cell(latitude, longitude)}
+
+
+def neighbouring_cells(latitude, longitude):
+    """The user's geo cell and the eight around it"""
+    row, column = _cell_index(latitude, longitude)
+    return ['%d:%d' % (row + dr, column + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+
+
+def levels(user):
+    """Segment filters for user from narrowest to widest; the last one matches everyone"""
+    from models import User
+
+    purpose = [User.looking_for == user.looking_for] if user.looking_for else []
+    availability = []
+    if user.availability and user.availability != FLEXIBLE:
+        availability = [User.availability.in_((user.availability, FLEXIBLE))]
+    age = []
+    if user.age is not None:
+        bucket = age_bucket(user.age)
+        age = [User.age_bucket.in_((bucket - 1, bucket, bucket + 1))]
+    nearby = []
+    if user.latitude is not None and user.longitude is not None:
+        nearby = [User.geo_cell.in_(neighbouring_cells(user.latitude, user.longitude))]
+
+    widening = [
+        purpose + availability + age + nearby,
+        purpose + availability + age,
+        purpose + availability,
+        purpose,
+        [],
+    ]
+    # Drop levels that filter the same as the one before (unset profile fields)
+    return [level for index, level in enumerate(widening)
+            if index == 0 or len(level) != len(widening[index - 1])]
+
+
+def select(user, query, wanted):
+    """Users from query (already filtered and column-restricted) to score for user.
+
+    Reads segment by segment, narrowest first, until wanted * CANDIDATES_PER_SUGGESTION
+    candidates are found or SUGGESTION_CANDIDATES have been loaded.
+    """
+    from models import User
+
+    budget = current_app.config['SUGGESTION_CANDIDATES']
+    target = min(budget, wanted * CANDIDATES_PER_SUGGESTION)
+    found = []
+    seen = [user.id]
+    for level in levels(user):
+        # Recently active users first within a segment
+        batch = query.filter(*level, User.id.notin_(seen)).order_by(
+            User.last_active.desc().nulls_last(), User.id
+        ).limit(budget - len(found)).all()
+        found.extend(batch)
+        seen.extend(candidate.id for candidate in batch)
+        if len(found) >= target or len(found) >= budget:
+            break
+    return found
@@ -0,0 +1,56 @@
+import json
+import click
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's flask CLI"""
+    @app.cli.command('retention')
+    @click.option('--ttl-days', type=int, default=None, help='Age after which read notifications are removed')
+    @click.option('--archive-notifications', is_flag=True, help='Copy notifications to notification_archive instead of only deleting')
+    @click.option('--archive-messages-days', type=int, default=None, help='Also archive messages older than this many days')
+    @click.option('--batch-size', type=int, default=None, help='Rows per delete batch')
+    def retention_command(ttl_days, archive_notifications, archive_messages_days, batch_size):
+        """Purge old read notifications and optionally archive old messages (run from cron)"""
+        import retention
+
+        options = {}
+        if ttl_days is not None:
+            options['notification_ttl_days'] = ttl_days
+        if archive_messages_days is not None:
+            options['message_archive_days'] = archive_messages_days
+        if batch_size is not None:
+            options['batch_size'] = batch_size
+
+        for stats in retention.run_retention(archive_notifications=archive_notifications, **options):
+            click.echo(json.dumps(stats))
+
+    @app.cli.command('partitions')
+    @click.option('--months-ahead', type=int, default=None, help='Months of Postgres partitions to create ahead')
+    def partitions_command(months_ahead):
+        """Create upcoming message partitions, or archive cold months on SQLite (run from cron)"""
+        import partitions
+
+        click.echo(json.dumps(partitions.rollover(months_ahead), default=str))
+
+    @app.cli.command('build-static')
+    def build_static_command():
+        """Precompress the text assets in static/ (.gz, and .br with brotli installed)"""
+        import http_cache
+
+        for stats in http_cache.build_static(app.static_folder):
+            click.echo(json.dumps(stats))
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """EXPLAIN the hot queries and fail if any of them needs a full table scan"""
+        import query_plans
+
+        failures = 0
+        for name, plan, scans in query_plans.check_hot_queries():
+            if scans:
+                failures += 1
+                click.echo(f"FAIL {name}: {'; '.join(scans)}")
+            else:
+                click.echo(f"ok   {name}")
+        if failures:
+            raise SystemExit(1)
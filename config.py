@@ -0,0 +1,110 @@
+import os
+
+
+class Config:
+    """Default configuration, read from the environment"""
+    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-12345')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+
+    # Connection pool, see database.engine_options; DB_POOL_SIZE defaults by worker model
+    DB_POOL_SIZE = int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 15000))
+    WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 50))
+
+    # Optional read replica for views marked @read_replica; a user who just wrote reads
+    # from the primary for DB_REPLICA_STICKY_SECONDS so they see their own changes
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+
+    # Mail is only initialised the first time an email is sent
+    MAIL_SERVER = 'smtp.gmail.com'
+    MAIL_PORT = 587
+    MAIL_USE_TLS = True
+    MAIL_USE_SSL = False
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+
+    UPLOAD_FOLDER = os.path.join('static', 'uploads')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+
+    # async_mode/message_queue come from the deploy config; None lets Flask-SocketIO auto-detect
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+
+    # Rendered user-card cache, see fragment_cache.py
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+    # Per-request / per-event SQL budgets, see sql_instrumentation.py. SQL_BUDGET_MODE is 'log'
+    # or 'raise'; the X-SQL-Stats header follows app.debug unless SQL_DEBUG_HEADER is set
+    SQL_QUERY_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET', 50))
+    SQL_REPEAT_BUDGET = int(os.environ.get('SQL_REPEAT_BUDGET', 5))
+    SQL_BUDGET_MODE = os.environ.get('SQL_BUDGET_MODE', 'log')
+    SQL_DEBUG_HEADER = os.environ['SQL_DEBUG_HEADER'] == '1' if os.environ.get('SQL_DEBUG_HEADER') else None
+
+    # Reconnect replay, see delivery.py; the buffer is unused when a message queue is set
+    DELIVERY_BUFFER_SIZE = int(os.environ.get('DELIVERY_BUFFER_SIZE', 5000))
+    DELIVERY_REPLAY_LIMIT = int(os.environ.get('DELIVERY_REPLAY_LIMIT', 200))
+    # Ids re-sent from behind the cursor in case they committed after a higher one
+    DELIVERY_REPLAY_WINDOW = int(os.environ.get('DELIVERY_REPLAY_WINDOW', 50))
+
+    # Token-bucket limits as "name=burst/refill_per_second", see rate_limit.py. `default`
+    # applies to socket events not listed. A redis:// URL shares the buckets across workers.
+    RATE_LIMITS = os.environ.get(
+        'RATE_LIMITS', 'send_message=10/2,group_message=10/2,join_group=10/1,default=30/5')
+    RATE_LIMITS_PER_USER = os.environ.get(
+        'RATE_LIMITS_PER_USER', 'send_message=30/5,group_message=30/5,update_location=10/0.5,message_search=10/1,default=60/10')
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL')
+
+    # Text responses at least this large are gzip/brotli compressed; static URLs carrying
+    # their content hash are cached this many seconds as immutable, see http_cache.py
+    HTTP_COMPRESS_MIN_BYTES = int(os.environ.get('HTTP_COMPRESS_MIN_BYTES', 1024))
+    HTTP_GZIP_LEVEL = int(os.environ.get('HTTP_GZIP_LEVEL', 6))
+    HTTP_BROTLI_QUALITY = int(os.environ.get('HTTP_BROTLI_QUALITY', 5))
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))
+
+    # Entries per in-process cache store, and the Redis server that carries invalidations
+    # between workers (local only when unset), see caching.py
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_INVALIDATION_URL = os.environ.get('CACHE_INVALIDATION_URL')
+
+    # Most users loaded and scored per friend suggestion request, see candidates.py
+    SUGGESTION_CANDIDATES = int(os.environ.get('SUGGESTION_CANDIDATES', 300))
+
+    # Retention job defaults, see retention.py; no MESSAGE_ARCHIVE_DAYS disables message archiving
+    NOTIFICATION_TTL_DAYS = int(os.environ.get('NOTIFICATION_TTL_DAYS', 30))
+    MESSAGE_ARCHIVE_DAYS = int(os.environ['MESSAGE_ARCHIVE_DAYS']) if os.environ.get('MESSAGE_ARCHIVE_DAYS') else None
+    RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 1000))
+    RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE', 0.05))
+
+    # Bearer token for GET /metrics, which is disabled without one, see metrics.py
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # On-demand sampling profiles, see profiling.py. POST /admin/profile needs the token and
+    # is disabled without one; SIGUSR2 writes a profile of each signalled worker to PROFILE_DIR
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+    PROFILING_MAX_SECONDS = int(os.environ.get('PROFILING_MAX_SECONDS', 60))
+    PROFILING_SIGNAL_SECONDS = int(os.environ.get('PROFILING_SIGNAL_SECONDS', 30))
+    PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', 10))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+    # Months of message history read by default (and kept out of the archive on SQLite), and
+    # how many months of Postgres partitions `flask partitions` creates ahead, see partitions.py
+    MESSAGE_HOT_MONTHS = int(os.environ.get('MESSAGE_HOT_MONTHS', 3))
+    MESSAGE_PARTITIONS_AHEAD = int(os.environ.get('MESSAGE_PARTITIONS_AHEAD', 3))
+
+    # Message search gives up on queries slower than this, see message_search.py
+    SEARCH_TIMEOUT_MS = int(os.environ.get('SEARCH_TIMEOUT_MS', 500))
+
+    # Friends seen within this many seconds count as online in the async presence API
+    PRESENCE_ONLINE_SECONDS = int(os.environ.get('PRESENCE_ONLINE_SECONDS', 300))
+
+    # Logging, see logging_setup.py for the formats
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_SAMPLING = os.environ.get('LOG_SAMPLING')
@@ -1,4 +1,136 @@
-
+import time
+import functools
+from flask import g, current_app, session as flask_session, has_app_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+
+REPLICA = 'replica'
+
+# Process-local read-your-writes marks for socket events, which can't update the cookie session
+_recent_writers = {}
+
+
+class RoutingSession(Session):
+    """Sends SELECTs to the replica bind while the current view is marked read-only.
+
+    Anything flushed or written through this session, and every statement after it,
+    stays on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not self.info.get('wrote')
+                and has_app_context() and g.get('db_use_replica')
+                and getattr(clause, 'is_select', False)):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def _sticky_change(instance):
+    """Whether instance has changes other than its class's NON_STICKY_CHANGES"""
+    exempt = getattr(instance, 'NON_STICKY_CHANGES', ())
+    return any(attr.history.has_changes() for attr in inspect(instance).attrs if attr.key not in exempt)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    # Bookkeeping such as User.last_active isn't read back, so it needn't pin the user to the primary
+    if session.new or session.deleted or any(_sticky_change(instance) for instance in session.dirty):
+        session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_writer(session):
+    if not session.info.pop('wrote', False) or not has_request_context():
+        return
+    # Only use a user Flask-Login already loaded; no SQL may run inside after_commit
+    user = g.get('_login_user')
+    if user is None or not user.is_authenticated:
+        return
+    now = time.time()
+    if len(_recent_writers) > 10000:
+        for user_id, until in list(_recent_writers.items()):
+            if until <= now:
+                _recent_writers.pop(user_id, None)
+    _recent_writers[user.id] = flask_session['db_primary_until'] = now + _sticky_seconds()
+    g.db_use_replica = False
+
+
+def _sticky_seconds():
+    return current_app.config['DB_REPLICA_STICKY_SECONDS']
+
+
+def _recently_wrote():
+    now = time.time()
+    if flask_session.get('db_primary_until', 0) > now:
+        return True
+    user_id = flask_session.get('_user_id')
+    return user_id is not None and _recent_writers.get(int(user_id), 0) > now
+
+
+def read_replica(view):
+    """Serve a view's reads from the replica unless this user wrote within the sticky window"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_use_replica = not _recently_wrote()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database and worker model"""
+    uri = config['SQLALCHEMY_DATABASE_URI'] or ''
+    options = {
+        # Drop connections the server or a proxy closed while they sat in the pool
+        'pool_pre_ping': True,
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    if uri.startswith('sqlite'):
+        return options
+
+    # Threaded workers hold at most one connection per thread; green workers multiplex many
+    # requests per process, so they get a larger pool plus overflow
+    pool_size = config['DB_POOL_SIZE']
+    if pool_size is None:
+        pool_size = config['WORKER_THREADS'] if config['SOCKETIO_ASYNC_MODE'] == 'threading' else 10
+    options.update(
+        pool_size=pool_size,
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+    )
+    if config['DB_STATEMENT_TIMEOUT_MS'] and uri.startswith('postgres'):
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+# Sync driver URL prefix -> the asyncio driver for the same database
+ASYNC_DRIVERS = (
+    ('postgresql+psycopg2://', 'postgresql+asyncpg://'),
+    ('postgresql://', 'postgresql+asyncpg://'),
+    ('postgres://', 'postgresql+asyncpg://'),
+    ('sqlite://', 'sqlite+aiosqlite://'),
+)
+
+
+def async_database_url(uri):
+    """SQLALCHEMY_DATABASE_URI rewritten for SQLAlchemy's asyncio engine"""
+    for sync_prefix, async_prefix in ASYNC_DRIVERS:
+        if uri.startswith(sync_prefix):
+            return async_prefix + uri[len(sync_prefix):]
+    return uri
+
 
-db = SQLAlchemy()
+def async_engine_options(config):
+    """engine_options() for create_async_engine; asyncpg takes server settings instead of -c options"""
+    options = engine_options(config)
+    connect_args = options.pop('connect_args', None)
+    if connect_args:
+        options['connect_args'] = {
+            'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}
+        }
+    return options
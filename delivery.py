@@ -0,0 +1,171 @@
+"""Replay of new_message / group_message emits a client missed while disconnected.
+
+Every payload carries the id of its Message or GroupMessage row, so a user's position in
+their delivery stream is the pair of highest ids they have seen. Clients send it on connect
+as the cursor "<message_id>:<group_message_id>". Ids are assigned before commit, so a lower
+id can become visible after a higher one; the replay therefore starts DELIVERY_REPLAY_WINDOW
+ids behind the cursor and clients drop events whose id they already handled (see
+static/js/delivery.js), which also covers live emits racing the replay after the room join.
+The gap comes from a ring buffer of this process's recent emits when the buffer still holds
+all of it, and otherwise from id range queries on the message tables.
+"""
+import threading
+from collections import deque
+from flask import current_app
+from database import db
+from models import User, Message, GroupMessage, group_membership
+import group_messages
+import partitions
+import metrics
+
+MESSAGE = 'message'
+GROUP_MESSAGE = 'group_message'
+KINDS = (MESSAGE, GROUP_MESSAGE)
+# Socket.IO event each kind is delivered as
+EVENTS = {MESSAGE: 'new_message', GROUP_MESSAGE: 'group_message'}
+
+REPLAYS = metrics.registry.register(metrics.Counter(
+    'delivery_replays_total', 'Reconnect replays by where the gap was read from', labels=('source',)))
+REPLAYED_EVENTS = metrics.registry.register(metrics.Counter(
+    'delivery_replayed_events_total', 'Events re-sent to reconnecting clients', labels=('source',)))
+
+
+class RingBuffer:
+    """The last `size` emits of this process, each with the ids of the users it went to.
+
+    floor[kind] is the highest id of that kind the buffer no longer holds (evicted, or sent
+    before recording began), so a cursor at or above it can be served from the buffer.
+    """
+
+    def __init__(self, size=5000):
+        self.entries = deque(maxlen=size)
+        self.floor = {}
+        self.lock = threading.Lock()
+
+    def resize(self, size):
+        with self.lock:
+            self.entries = deque(maxlen=size)
+            self.floor = {}
+
+    def record(self, kind, item_id, user_ids, payload):
+        if not self.entries.maxlen:
+            return
+        with self.lock:
+            if kind not in self.floor:
+                self.floor[kind] = item_id - 1
+            if len(self.entries) == self.entries.maxlen:
+                old_kind, old_id = self.entries[0][:2]
+                self.floor[old_kind] = max(self.floor[old_kind], old_id)
+            self.entries.append((kind, item_id, frozenset(user_ids), payload))
+
+    def after(self, user_id, cursor):
+        """{kind: [payload, ...]} newer than cursor for user_id, or None if not all held"""
+        with self.lock:
+            for kind in KINDS:
+                floor = self.floor.get(kind)
+                if floor is None or cursor[kind] < floor:
+                    return None
+            found = {kind: [] for kind in KINDS}
+            for kind, item_id, user_ids, payload in self.entries:
+                if item_id > cursor[kind] and user_id in user_ids:
+                    found[kind].append(payload)
+            return found
+
+    def stats(self):
+        return {'entries': len(self.entries), 'size': self.entries.maxlen or 0}
+
+
+buffer = RingBuffer()
+
+
+def record(kind, item_id, user_ids, payload):
+    """Remember an emit so it can be replayed; call after the row is committed"""
+    buffer.record(kind, item_id, user_ids, payload)
+
+
+def parse_cursor(value):
+    """'<message_id>:<group_message_id>' -> {kind: id}, or None if missing or malformed"""
+    try:
+        message_id, group_message_id = (int(part) for part in str(value).split(':'))
+    except (TypeError, ValueError):
+        return None
+    return {MESSAGE: message_id, GROUP_MESSAGE: group_message_id}
+
+
+def format_cursor(cursor):
+    return f'{cursor[MESSAGE]}:{cursor[GROUP_MESSAGE]}'
+
+
+def current_cursor():
+    """Cursor at the newest rows, for clients that don't have one yet"""
+    message_id, group_message_id = db.session.execute(db.select(
+        db.select(db.func.max(Message.id)).scalar_subquery(),
+        db.select(db.func.max(GroupMessage.id)).scalar_subquery()
+    )).one()
+    return {MESSAGE: message_id or 0, GROUP_MESSAGE: group_message_id or 0}
+
+
+def _from_database(user_id, cursor, limit):
+    """Up to limit + 1 rows of each kind after cursor, using the (user, id) indexes.
+
+    A reconnect gap is recent, so only the hot partitions are searched.
+    """
+    sender = db.selectinload(Message.sender).load_only(User.id, User.username)
+    messages = {}
+    # Sent and received separately so each side is one index range scan
+    for column in (Message.recipient_id, Message.sender_id):
+        for message in Message.query.options(sender).filter(
+                column == user_id, Message.id > cursor[MESSAGE], partitions.hot(Message.created_at)
+        ).order_by(Message.id).limit(limit + 1):
+            messages[message.id] = message
+    found_messages = [messages[message_id].to_dict() for message_id in sorted(messages)]
+
+    groups = db.select(group_membership.c.group_id).where(group_membership.c.user_id == user_id)
+    found_group_messages = [group_messages.to_dict(message) for message in GroupMessage.query.options(
+        db.selectinload(GroupMessage.sender).load_only(User.id, User.username)
+    ).filter(
+        GroupMessage.group_id.in_(groups), GroupMessage.id > cursor[GROUP_MESSAGE],
+        partitions.hot(GroupMessage.created_at)
+    ).order_by(GroupMessage.id).limit(limit + 1)]
+
+    return {MESSAGE: found_messages, GROUP_MESSAGE: found_group_messages}
+
+
+def replay(user_id, cursor_value):
+    """Events a reconnecting user missed, and the cursor they should continue from.
+
+    Returns (events, cursor, resync). events is a list of (event name, payload); cursor is
+    set when the client must replace its own: when it sent none, or when the gap held more
+    than DELIVERY_REPLAY_LIMIT messages of a kind. events may repeat some the client already
+    has from the window behind its cursor. resync is True in the latter case, and
+    the client should reload what it shows instead of relying on the replay.
+    """
+    cursor = parse_cursor(cursor_value)
+    if cursor is None:
+        return [], format_cursor(current_cursor()), False
+
+    limit = current_app.config['DELIVERY_REPLAY_LIMIT']
+    window = current_app.config['DELIVERY_REPLAY_WINDOW']
+    cursor = {kind: max(0, cursor[kind] - window) for kind in KINDS}
+    found = buffer.after(user_id, cursor)
+    source = 'buffer'
+    if found is None:
+        found = _from_database(user_id, cursor, limit)
+        source = 'database'
+
+    truncated = any(len(payloads) > limit for payloads in found.values())
+    events = [(EVENTS[kind], payload) for kind in KINDS for payload in found[kind][:limit]]
+    REPLAYS.inc(source)
+    REPLAYED_EVENTS.inc(source, amount=len(events))
+    if truncated:
+        return events, format_cursor(current_cursor()), True
+    return events, None, False
+
+
+def init_app(app):
+    # With a message queue other processes emit too, so this process's buffer has gaps
+    buffer.resize(0 if app.config['SOCKETIO_MESSAGE_QUEUE'] else app.config['DELIVERY_BUFFER_SIZE'])
+    metrics.registry.register(metrics.Gauge(
+        'delivery_buffer', 'Reconnect replay buffer state',
+        lambda: {(name,): value for name, value in buffer.stats().items()}, labels=('stat',)
+    ))
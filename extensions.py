@@ -0,0 +1,32 @@
+from flask import current_app
+from flask_login import LoginManager
+from flask_migrate import Migrate
+from flask_socketio import SocketIO
+import sql_instrumentation
+import metrics
+import rate_limit
+
+# Extension instances are created unbound and attached to an app in create_app()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+migrate = Migrate()
+socketio = SocketIO()
+
+
+def get_mail():
+    """Flask-Mail state for the current app, imported and initialised on first use"""
+    state = current_app.extensions.get('mail')
+    if state is None:
+        from flask_mail import Mail
+        state = Mail().init_app(current_app)
+    return state
+
+
+def socket_event(name):
+    """Register a rate-limited Socket.IO handler with SQL and latency instrumentation"""
+    def decorator(handler):
+        handler = rate_limit.limit_event(name)(handler)
+        handler = sql_instrumentation.track_event(name)(handler)
+        handler = metrics.track_event(name)(handler)
+        return socketio.on(name)(handler)
+    return decorator
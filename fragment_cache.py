@@ -0,0 +1,130 @@
+"""Rendered HTML for user cards, cached per (kind, user, profile version, viewer context).
+
+Templates call user_fragment('card', user) instead of rendering the card body inline. The
+profile version comes from the row being rendered, so other workers' edits are picked up
+on their own; invalidate_user() additionally frees this process's stale entries.
+"""
+import threading
+from collections import OrderedDict
+from flask import render_template
+from flask_login import current_user
+from markupsafe import Markup
+import metrics
+from serializers import SELF, FRIEND, PUBLIC
+
+# Template rendered for each fragment kind; they receive `user` and `viewer_context`
+TEMPLATES = {
+    'card': 'fragments/user_card.html',
+    'avatar': 'fragments/user_avatar.html',
+}
+
+
+class FragmentCache:
+    """LRU of rendered fragments bounded by entry count and total size in bytes"""
+
+    def __init__(self, max_entries=5000, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.by_user = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            html = self.entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        cost = len(html.encode())
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = html
+            self.by_user.setdefault(key[1], set()).add(key)
+            self.size += cost
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for key in self.by_user.pop(user_id, ()):
+                self._remove(key, keep_index=True)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_user.clear()
+            self.size = 0
+
+    def _remove(self, key, keep_index=False):
+        html = self.entries.pop(key, None)
+        if html is None:
+            return
+        self.size -= len(html.encode())
+        if not keep_index:
+            keys = self.by_user.get(key[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_user[key[1]]
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+cache = FragmentCache()
+
+
+def viewer_context(user):
+    """How the current viewer relates to user, which decides what their card may show"""
+    import friendships
+    if not current_user.is_authenticated:
+        return PUBLIC
+    if current_user.id == user.id:
+        return SELF
+    if user.id in friendships.friend_ids(current_user.id):
+        return FRIEND
+    return PUBLIC
+
+
+def user_fragment(kind, user):
+    """Rendered fragment for user, from the cache when its profile version is unchanged"""
+    context = viewer_context(user)
+    key = (kind, user.id, user.profile_version, context)
+    html = cache.get(key)
+    if html is None:
+        html = render_template(TEMPLATES[kind], user=user, viewer_context=context)
+        cache.set(key, html)
+    return Markup(html)
+
+
+def invalidate_user(user_id):
+    cache.invalidate_user(user_id)
+
+
+def init_app(app):
+    cache.max_entries = app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+    cache.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+    app.jinja_env.globals['user_fragment'] = user_fragment
+    metrics.registry.register(metrics.Gauge(
+        'fragment_cache', 'Rendered user-card cache state',
+        lambda: {(name,): value for name, value in cache.stats().items()}, labels=('stat',)
+    ))
@@ -0,0 +1,123 @@
+from database import db
+from models import User, FriendRequest, friend_connection
+import caching
+
+FRIEND = 'friend'
+PENDING_SENT = 'pending_sent'
+PENDING_RECEIVED = 'pending_received'
+NONE = 'none'
+
+# Writes through add_friend/remove_friend invalidate the affected users' friend-id sets in
+# every worker when their transaction commits; the TTL bounds a missed invalidation.
+FRIEND_IDS_TTL = 60
+
+
+@caching.cached('friend_ids', ttl=FRIEND_IDS_TTL)
+def friend_ids(user_id):
+    """Set of the user's friend ids, loaded with one query on a cache miss"""
+    # Always read from the primary so a replica lagging behind an accept is never cached
+    return frozenset(db.session.execute(
+        db.select(friend_connection.c.friend_id).where(friend_connection.c.user_id == user_id),
+        bind_arguments={'bind': db.engine}
+    ).scalars())
+
+
+def invalidate(*user_ids):
+    """Forget cached friend ids once the current transaction commits"""
+    caching.invalidate('friend_ids', *user_ids)
+
+
+def statuses(user, user_ids):
+    """Map each id to FRIEND, PENDING_SENT, PENDING_RECEIVED or NONE relative to user.
+
+    One query for the friend set (none when cached) and one for pending requests either way.
+    """
+    user_ids = set(user_ids)
+    result = dict.fromkeys(user_ids, NONE)
+    if not user_ids:
+        return result
+
+    friends = friend_ids(user.id)
+    for user_id in user_ids & friends:
+        result[user_id] = FRIEND
+
+    others = user_ids - friends
+    if others:
+        pending = db.session.execute(
+            db.select(FriendRequest.sender_id, FriendRequest.receiver_id).where(
+                FriendRequest.status == 'pending',
+                db.or_(
+                    db.and_(FriendRequest.sender_id == user.id, FriendRequest.receiver_id.in_(others)),
+                    db.and_(FriendRequest.receiver_id == user.id, FriendRequest.sender_id.in_(others))
+                )
+            )
+        )
+        for sender_id, receiver_id in pending:
+            if sender_id == user.id:
+                result[receiver_id] = PENDING_SENT
+            else:
+                result[sender_id] = PENDING_RECEIVED
+    return result
+
+
+def send_requests(sender_id, receiver_ids):
+    """Create pending requests from sender to every eligible receiver in one INSERT ... SELECT.
+
+    Skips the sender, unknown ids, existing friends and pairs that already have a request in
+    either direction. Returns the number of requests created; the caller commits.
+    """
+    receiver_ids = set(receiver_ids) - {sender_id}
+    if not receiver_ids:
+        return 0
+
+    request = FriendRequest.__table__
+    now = db.func.now()
+    eligible = db.select(
+        db.literal(sender_id), User.id, db.literal('pending'), now, now
+    ).where(
+        User.id.in_(receiver_ids),
+        ~db.exists().where(db.or_(
+            db.and_(request.c.sender_id == sender_id, request.c.receiver_id == User.id),
+            db.and_(request.c.sender_id == User.id, request.c.receiver_id == sender_id)
+        )),
+        ~db.exists().where(friend_connection.c.user_id == sender_id,
+                           friend_connection.c.friend_id == User.id)
+    )
+    result = db.session.execute(db.insert(request).from_select(
+        ['sender_id', 'receiver_id', 'status', 'created_at', 'updated_at'], eligible
+    ))
+    return result.rowcount
+
+
+def respond_to_requests(receiver_id, request_ids, accept):
+    """Accept or decline the receiver's pending requests among request_ids.
+
+    One UPDATE flips the still-pending rows and returns their senders; on accept the
+    friendships are added with a single multi-row insert in both directions. Returns the
+    sender ids that were handled; the caller commits.
+    """
+    request = FriendRequest.__table__
+    sender_ids = db.session.execute(
+        db.update(request)
+        .where(request.c.id.in_(set(request_ids)),
+               request.c.receiver_id == receiver_id,
+               request.c.status == 'pending')
+        .values(status='accepted' if accept else 'declined', updated_at=db.func.now())
+        .returning(request.c.sender_id)
+    ).scalars().all()
+    if not accept or not sender_ids:
+        return sender_ids
+
+    already = set(db.session.execute(
+        db.select(friend_connection.c.friend_id).where(
+            friend_connection.c.user_id == receiver_id,
+            friend_connection.c.friend_id.in_(sender_ids)
+        )
+    ).scalars())
+    new_friends = [sender_id for sender_id in sender_ids if sender_id not in already]
+    if new_friends:
+        rows = [{'user_id': receiver_id, 'friend_id': sender_id} for sender_id in new_friends]
+        rows += [{'user_id': sender_id, 'friend_id': receiver_id} for sender_id in new_friends]
+        db.session.execute(db.insert(friend_connection).values(rows))
+        invalidate(receiver_id, *new_friends)
+    return sender_ids
@@ -0,0 +1,88 @@
+from database import db
+from models import User, ChatGroup, GroupMessage, GroupMessageArchive, group_membership
+import partitions
+import caching
+
+# Messages per history window, and the most a client may ask for at once
+HISTORY_PAGE = 50
+MAX_HISTORY_PAGE = 200
+
+
+def next_seq(group_id):
+    """Reserve the group's next sequence number.
+
+    The increment is a single UPDATE ... RETURNING, so concurrent senders are serialised on
+    the group row and never share a number. Runs in the caller's transaction.
+    """
+    group = ChatGroup.__table__
+    return db.session.execute(
+        db.update(group)
+        .where(group.c.id == group_id)
+        .values(last_seq=group.c.last_seq + 1)
+        .returning(group.c.last_seq)
+    ).scalar_one()
+
+
+@caching.cached('group_members', ttl=300)
+def member_ids(group_id):
+    """Frozen set of the group's member ids; membership only changes when a group is created"""
+    return frozenset(db.session.execute(
+        db.select(group_membership.c.user_id).where(group_membership.c.group_id == group_id)
+    ).scalars())
+
+
+def is_member(group_id, user_id):
+    return user_id in member_ids(group_id)
+
+
+def _newest(model, group_id, before_seq, limit, hot_only=False):
+    query = model.query.options(
+        db.selectinload(model.sender).load_only(User.id, User.username)
+    ).filter(model.group_id == group_id)
+    if before_seq is not None:
+        query = query.filter(model.seq < before_seq)
+    if hot_only:
+        query = query.filter(partitions.hot(model.created_at))
+    return query.order_by(model.seq.desc()).limit(limit).all()
+
+
+def window(group_id, before_seq=None, after_seq=None, limit=HISTORY_PAGE):
+    """Up to limit messages in seq order, with their senders loaded in one batched query.
+
+    With after_seq, the oldest messages after it (catching up / scrolling forward);
+    otherwise the newest messages before before_seq, or the newest overall. The newest
+    window is read from the hot months first; scrolling back past the live table continues
+    into the archive.
+    """
+    limit = max(1, min(limit, MAX_HISTORY_PAGE))
+    if after_seq is not None:
+        return GroupMessage.query.options(
+            db.selectinload(GroupMessage.sender).load_only(User.id, User.username)
+        ).filter(
+            GroupMessage.group_id == group_id, GroupMessage.seq > after_seq
+        ).order_by(GroupMessage.seq.asc()).limit(limit).all()
+
+    messages = []
+    if before_seq is None:
+        messages = _newest(GroupMessage, group_id, None, limit, hot_only=True)
+    if len(messages) < limit:
+        messages = _newest(GroupMessage, group_id, before_seq, limit)
+    if len(messages) < limit:
+        oldest = messages[-1].seq if messages else before_seq
+        messages += _newest(GroupMessageArchive, group_id, oldest, limit - len(messages))
+    messages.reverse()
+    return messages
+
+
+def to_dict(message, sender_username=None):
+    return {
+        'id': message.id,
+        'group_id': message.group_id,
+        'seq': message.seq,
+        'sender_id': message.sender_id,
+        'sender_username': sender_username or message.sender.username,
+        'content': message.content,
+        'media_url': message.media_url,
+        'media_type': message.media_type,
+        'created_at': message.created_at.isoformat()
+    }
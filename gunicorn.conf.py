@@ -0,0 +1,76 @@
+# Production server configuration: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Everything is driven by environment variables so deploys need no code edits:
+#   PORT                    listen port (default 5000)
+#   WEB_CONCURRENCY         worker processes (default 1; more needs SOCKETIO_MESSAGE_QUEUE)
+#   WORKER_CLASS            gevent (default), eventlet or threaded
+#   WORKER_THREADS          threads per worker for the threaded class (default 50)
+#   WORKER_CONNECTIONS      concurrent clients per gevent/eventlet worker (default 1000)
+#   GRACEFUL_TIMEOUT        seconds workers get to finish in-flight work on shutdown (default 30)
+#
+# `pkill -USR2 -P <master pid>` makes every worker write a sampling profile (profiling.py).
+import os
+import logging
+
+logger = logging.getLogger('gunicorn.error')
+
+WORKER_CLASSES = {
+    'gevent': 'gevent',
+    'eventlet': 'eventlet',
+    'threaded': 'gthread',
+}
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_class = WORKER_CLASSES[os.environ.get('WORKER_CLASS', 'gevent')]
+threads = int(os.environ.get('WORKER_THREADS', 50)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+# Long-lived websocket connections must not be treated as hung requests
+timeout = int(os.environ.get('WORKER_TIMEOUT', 120))
+keepalive = 5
+
+# Import the app once in the master so forks share its memory and start quickly
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+# Flask-SocketIO picks its async mode from this; keep it in step with the worker class
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', {'gthread': 'threading'}.get(worker_class, worker_class))
+
+
+def on_starting(server):
+    if workers > 1 and not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        logger.warning("WEB_CONCURRENCY > 1 without SOCKETIO_MESSAGE_QUEUE: Socket.IO emits will "
+                       "only reach clients on the emitting worker, and clients need sticky sessions")
+
+
+def post_fork(server, worker):
+    # Connections opened in the master during preload must not be shared with children.
+    # close=False leaves the parent's sockets alone and just gives this worker a fresh pool.
+    import caching
+    import logging_setup
+    from database import db
+    logging_setup.restart_listener()
+    caching.start_listener()
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+    logger.info("Worker %s ready (%s)", worker.pid, worker_class)
+
+
+def post_worker_init(worker):
+    # After gunicorn has reset the worker's signal handlers: SIGUSR2 writes a sampling profile
+    import profiling
+    profiling.start_signal_profiler(worker.app.wsgi())
+
+
+def worker_int(worker):
+    logger.info("Worker %s interrupted, shutting down", worker.pid)
+
+
+def worker_exit(server, worker):
+    from database import db
+    with server.app.wsgi().app_context():
+        db.engine.dispose()
@@ -0,0 +1,190 @@
+"""Response compression, JSON validators and long-lived caching of static files.
+
+- Text responses over HTTP_COMPRESS_MIN_BYTES are compressed with brotli (when the brotli
+  package is installed) or gzip, whichever the client prefers.
+- JSON GET responses get a weak ETag of their body and answer If-None-Match (and
+  If-Modified-Since, for views that set response.last_modified) with 304.
+- url_for('static', ...) adds ?v=<content hash>. A request carrying the file's current
+  hash is cached for STATIC_MAX_AGE as immutable, so a changed file is a new URL. Upload
+  URLs are built the same way when the upload is saved, so replaced media gets a new URL.
+- `flask build-static` writes .gz / .br copies of the text assets next to them, which
+  the static view serves to clients that accept them instead of the original.
+"""
+import os
+import gzip
+import stat
+import hashlib
+import mimetypes
+import threading
+from flask import abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'image/svg+xml')
+# Assets `flask build-static` precompresses; uploads are media and are never compressed
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.html', '.txt', '.map')
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSED = metrics.registry.register(metrics.Counter(
+    'http_compressed_responses_total', 'Responses compressed on the fly', labels=('encoding',)))
+NOT_MODIFIED = metrics.registry.register(metrics.Counter(
+    'http_not_modified_total', 'JSON responses answered with 304 Not Modified'))
+
+
+class StaticVersions:
+    """Content hash of each static file, recomputed when its size or mtime changes"""
+
+    def __init__(self):
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """Hash of the file at path, already resolved with safe_join; None unless a regular file"""
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        key = (info.st_mtime_ns, info.st_size)
+        cached = self.versions.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.blake2b(digest_size=8)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        version = digest.hexdigest()
+        with self.lock:
+            self.versions[path] = (key, version)
+        return version
+
+
+versions = StaticVersions()
+
+
+def _is_text(mimetype):
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def _encoding(choices):
+    """The client's preferred encoding among choices, or None"""
+    return request.accept_encodings.best_match(choices) if choices else None
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['HTTP_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=config['HTTP_GZIP_LEVEL'], mtime=0)
+
+
+def add_static_version(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        path = safe_join(current_app.static_folder, values['filename'])
+        version = path and versions.get(path)
+        if version:
+            values['v'] = version
+
+
+def static_file(filename):
+    """The static view, serving a precompressed copy when one is current and accepted"""
+    folder = current_app.static_folder
+    path = safe_join(folder, filename)
+    if path is None:
+        abort(404)
+    immutable = request.args.get('v') and request.args['v'] == versions.get(path)
+    max_age = current_app.config['STATIC_MAX_AGE'] if immutable else None
+
+    available = []
+    for encoding, suffix in PRECOMPRESSED:
+        try:
+            if os.path.getmtime(path + suffix) >= os.path.getmtime(path):
+                available.append(encoding)
+        except OSError:
+            continue
+    encoding = _encoding(available)
+    if encoding:
+        response = send_from_directory(folder, filename + dict(PRECOMPRESSED)[encoding],
+                                       mimetype=mimetypes.guess_type(filename)[0], max_age=max_age)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(folder, filename, max_age=max_age)
+    if available:
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+def finish_response(response):
+    """after_request: validators for JSON, then compression"""
+    config = current_app.config
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+
+    if request.method == 'GET' and response.status_code == 200 and response.mimetype == 'application/json':
+        if not response.get_etag()[0]:
+            response.add_etag(weak=True)
+        # Per-user data: browsers keep it but must revalidate each time
+        if not response.cache_control.public:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            NOT_MODIFIED.inc()
+            return response
+
+    if response.status_code < 200 or response.status_code in (204, 304) or not _is_text(response.mimetype):
+        return response
+    data = response.get_data()
+    if len(data) < config['HTTP_COMPRESS_MIN_BYTES']:
+        return response
+    encoding = _encoding(['br', 'gzip'] if brotli else ['gzip'])
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding, config))
+    response.headers['Content-Encoding'] = encoding
+    COMPRESSED.inc(encoding)
+    return response
+
+
+def build_static(folder):
+    """Write .gz (and .br with brotli installed) beside each text asset; returns stats"""
+    stats = []
+    uploads = os.path.join(folder, 'uploads')
+    for root, dirs, files in os.walk(folder):
+        if root.startswith(uploads):
+            continue
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            outputs = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli:
+                outputs['.br'] = brotli.compress(data, quality=11)
+            for suffix, compressed in outputs.items():
+                # Not worth serving if it doesn't shrink; drop a stale copy instead
+                if len(compressed) >= len(data):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                    continue
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                stats.append({'file': os.path.relpath(path, folder) + suffix,
+                              'bytes': len(data), 'compressed': len(compressed)})
+    return stats
+
+
+def init_app(app):
+    app.url_defaults(add_static_version)
+    app.view_functions['static'] = static_file
+    app.after_request(finish_response)
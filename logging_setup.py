@@ -0,0 +1,168 @@
+"""Application logging: records are queued on the calling thread and written by a listener.
+
+Configured from the app config (and so from the environment, see config.Config):
+  LOG_LEVEL      root level (default INFO)
+  LOG_LEVELS     per-logger overrides, e.g. "routes.auth=WARNING,sqlalchemy.engine=INFO"
+  LOG_FORMAT     json (default) or text
+  LOG_SAMPLING   rate limits for chatty loggers below WARNING, as "<logger>=<count>/<seconds>",
+                 e.g. "routes.auth=20/60"; each message template gets its own window
+"""
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through extra= and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through at most count records per message template every window seconds.
+
+    Only applies to records below WARNING from the configured loggers (and their children).
+    The first record after a window that dropped anything carries a 'sampled_out' count.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = limits
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def _limit_for(self, name):
+        while name:
+            if name in self.limits:
+                return self.limits[name]
+            name = name.rpartition('.')[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        limit = self._limit_for(record.name)
+        if limit is None:
+            return True
+
+        count, seconds = limit
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            started, seen, dropped = self.windows.get(key, (now, 0, 0))
+            if now - started >= seconds:
+                if dropped:
+                    record.sampled_out = dropped
+                started, seen, dropped = now, 0, 0
+            seen += 1
+            allowed = seen <= count
+            self.windows[key] = (started, seen, dropped if allowed else dropped + 1)
+        return allowed
+
+
+class _InProcessQueueHandler(QueueHandler):
+    # The stock prepare() runs the full formatter so records can be pickled. Our queue never
+    # leaves the process, so only interpolate the arguments here (they may be ORM objects that
+    # must not be touched from the listener thread) and leave formatting to the listener.
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def parse_levels(value):
+    """"a=DEBUG,b.c=WARNING" -> {'a': 'DEBUG', 'b.c': 'WARNING'}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_sampling(value):
+    """"a=20/60" -> {'a': (20, 60.0)}"""
+    limits = {}
+    for name, rate in parse_levels(value).items():
+        count, _, seconds = rate.partition('/')
+        limits[name] = (int(count), float(seconds or 1))
+    return limits
+
+
+def configure(config):
+    """(Re)configure the root logger from a config mapping and start the queue listener"""
+    global _queue_handler
+    stop()
+
+    stream = logging.StreamHandler(sys.stderr)
+    if config.get('LOG_FORMAT', 'json') == 'json':
+        stream.setFormatter(JSONFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    _queue_handler = _InProcessQueueHandler(queue.SimpleQueue())
+    sampling = parse_sampling(config.get('LOG_SAMPLING'))
+    if sampling:
+        _queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(config.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start(stream)
+
+
+def _start(stream):
+    global _listener
+    _listener = QueueListener(_queue_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def restart_listener():
+    """Start a fresh listener thread; a forked worker does not inherit the parent's"""
+    global _listener
+    if _listener is not None:
+        handlers = _listener.handlers
+        _listener = None
+        _start(*handlers)
+
+
+def stop():
+    """Flush queued records and stop the listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
@@ -1,11 +1,20 @@
-from app import app, db
+"""Development server: applies migrations and runs the Werkzeug reloader with debug on.
+
+Production uses gunicorn instead (gunicorn -c gunicorn.conf.py wsgi:app) and runs
+'flask db upgrade' as a release step.
+"""
+import os
 import socket
 import logging
+from app import create_app
+from extensions import socketio
+from flask_migrate import upgrade
+import caching
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+APP_ENV = os.environ.get('APP_ENV', 'development')
+
 def find_available_port(start_port=5000, max_attempts=10):
     """Find an available port starting from start_port"""
     for port in range(start_port, start_port + max_attempts):
@@ -13,10 +22,10 @@ def find_available_port(start_port=5000, max_attempts=10):
             # Test if port is available
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.bind(('0.0.0.0', port))
-                logger.info(f"Found available port: {port}")
+                logger.info("Found available port: %s", port)
                 return port
         except OSError as e:
-            logger.debug(f"Port {port} is in use, trying next port: {str(e)}")
+            logger.debug("Port %s is in use, trying next port: %s", port, e)
             continue
 
     error_msg = f"Could not find an available port in range {start_port}-{start_port + max_attempts}"
@@ -24,15 +33,21 @@ def find_available_port(start_port=5000, max_attempts=10):
     raise RuntimeError(error_msg)
 
 if __name__ == "__main__":
+    if APP_ENV != 'development':
+        raise SystemExit("main.py is the development server; use 'gunicorn -c gunicorn.conf.py wsgi:app'")
+
+    app = create_app({'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'DEBUG'), 'LOG_FORMAT': os.environ.get('LOG_FORMAT', 'text')})
     with app.app_context():
-        # Create database tables
-        db.create_all()
-        logger.info("Database tables created successfully")
+        # Apply pending schema migrations
+        upgrade()
+        logger.info("Database migrations applied successfully")
+    # Apply cache invalidations published by other processes, e.g. CLI jobs
+    caching.start_listener()
 
     try:
         port = find_available_port()
-        logger.info(f"Starting server on port {port}")
-        app.run(host='0.0.0.0', port=port, debug=True)
+        logger.info("Starting development server on port %s", port)
+        socketio.run(app, host='0.0.0.0', port=port, debug=True, allow_unsafe_werkzeug=True)
     except Exception as e:
-        logger.error(f"Failed to start server: {e}")
-        raise
\ No newline at end of file
+        logger.error("Failed to start server: %s", e)
+        raise
@@ -0,0 +1,168 @@
+"""Full-text search over the direct and group messages a user can see.
+
+handle_message / handle_group_message add a MessageSearch row in the same transaction as the
+message; the backend's text index (tsvector + GIN on Postgres, FTS5 on SQLite) is kept up to
+date from that row by the database. Results are newest first, paged by MessageSearch.id, and
+each query runs under SEARCH_TIMEOUT_MS.
+"""
+import re
+import time
+from contextlib import contextmanager
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy.exc import OperationalError
+from database import db
+from models import User, MessageSearch, group_membership
+
+DIRECT = 'direct'
+GROUP = 'group'
+
+SEARCH_PAGE = 20
+MAX_TERMS = 8
+# Highlight markers put in snippets by the database, swapped for <mark> after escaping
+START, STOP = '\x02', '\x03'
+SNIPPET_WORDS = 12
+
+
+def index(kind, message):
+    """Add a flushed message to the search index; call before its transaction commits"""
+    if not message.content:
+        return
+    # Copied with INSERT ... SELECT so server-side defaults like created_at needn't be loaded
+    table = type(message).__table__
+    null = db.null()
+    row = db.select(
+        db.literal(kind), table.c.id, table.c.sender_id,
+        table.c.recipient_id if kind == DIRECT else null,
+        table.c.group_id if kind == GROUP else null,
+        table.c.content, table.c.created_at
+    ).where(table.c.id == message.id)
+    db.session.execute(db.insert(MessageSearch).from_select(
+        ['kind', 'message_id', 'sender_id', 'recipient_id', 'group_id', 'content', 'created_at'], row))
+
+
+def remove(kind, message_ids):
+    """Drop messages from the index, e.g. when retention archives them"""
+    db.session.execute(db.delete(MessageSearch).where(
+        MessageSearch.kind == kind, MessageSearch.message_id.in_(message_ids)))
+
+
+def terms(query):
+    """Words of the query, as both backends tokenize them; each must match, the last as a prefix"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _visible_to(user_id):
+    groups = db.select(group_membership.c.group_id).where(group_membership.c.user_id == user_id)
+    return db.or_(
+        MessageSearch.sender_id == user_id,
+        MessageSearch.recipient_id == user_id,
+        MessageSearch.group_id.in_(groups)
+    )
+
+
+def _statement(dialect, words, user_id, before_id, limit):
+    columns = (MessageSearch.id, MessageSearch.kind, MessageSearch.message_id, MessageSearch.sender_id,
+               MessageSearch.recipient_id, MessageSearch.group_id, MessageSearch.created_at,
+               User.username.label('sender_username'))
+    page = [_visible_to(user_id)]
+    if before_id is not None:
+        page.append(MessageSearch.id < before_id)
+
+    if dialect == 'sqlite':
+        fts = db.literal_column('message_search_fts')
+        match = ' '.join(f'"{word}"' for word in words) + '*'
+        return db.select(
+            *columns,
+            db.func.snippet(fts, 0, START, STOP, '…', SNIPPET_WORDS).label('snippet')
+        ).select_from(MessageSearch).join(
+            db.table('message_search_fts', db.column('rowid')),
+            db.literal_column('message_search_fts.rowid') == MessageSearch.id
+        ).join(User, User.id == MessageSearch.sender_id).where(
+            fts.op('MATCH')(match), *page
+        ).order_by(MessageSearch.id.desc()).limit(limit)
+
+    if dialect == 'postgresql':
+        tsquery = db.func.to_tsquery('simple', ' & '.join(words) + ':*')
+        # Pick the page first so ts_headline only runs on the rows returned
+        hits = db.select(MessageSearch.id).where(
+            db.literal_column('message_search.document').op('@@')(tsquery), *page
+        ).order_by(MessageSearch.id.desc()).limit(limit).subquery()
+        options = f'StartSel={START}, StopSel={STOP}, MaxWords={SNIPPET_WORDS * 2}, MinWords={SNIPPET_WORDS // 2}'
+        return db.select(
+            *columns,
+            db.func.ts_headline('simple', MessageSearch.content, tsquery, options).label('snippet')
+        ).join(hits, hits.c.id == MessageSearch.id).join(
+            User, User.id == MessageSearch.sender_id
+        ).order_by(MessageSearch.id.desc())
+
+    # No text index on other backends; correct but scans
+    return db.select(*columns, MessageSearch.content.label('snippet')).join(
+        User, User.id == MessageSearch.sender_id
+    ).where(
+        *[MessageSearch.content.ilike(f'%{word}%') for word in words], *page
+    ).order_by(MessageSearch.id.desc()).limit(limit)
+
+
+@contextmanager
+def _time_budget(connection, milliseconds):
+    """Abort statements on connection that run longer than milliseconds"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        # A cancelled statement aborts the transaction, which discards the SET LOCAL anyway
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(milliseconds)}')
+        yield
+        connection.exec_driver_sql('SET LOCAL statement_timeout TO DEFAULT')
+    elif dialect == 'sqlite':
+        raw = connection.connection.driver_connection
+        deadline = time.monotonic() + milliseconds / 1000
+        raw.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        try:
+            yield
+        finally:
+            raw.set_progress_handler(None, 0)
+    else:
+        yield
+
+
+def _snippet(text):
+    """Escaped snippet HTML with the matches wrapped in <mark>"""
+    return str(escape(text)).replace(START, '<mark>').replace(STOP, '</mark>')
+
+
+def search(user_id, query, before_id=None, limit=SEARCH_PAGE):
+    """Messages visible to user_id that contain every word of query, newest first.
+
+    Returns (hits, next_before_id, timed_out); pass next_before_id back as before_id for the
+    next page. A query over the time budget returns no hits and timed_out=True.
+    """
+    words = terms(query)
+    if not words:
+        return [], None, False
+
+    probe = db.select(MessageSearch.id)
+    bind = db.session.get_bind(clause=probe)
+    statement = _statement(bind.dialect.name, words, user_id, before_id, limit)
+    connection = db.session.connection(bind_arguments={'bind': bind})
+    try:
+        with _time_budget(connection, current_app.config['SEARCH_TIMEOUT_MS']):
+            rows = db.session.execute(statement, bind_arguments={'bind': bind}).all()
+    except OperationalError:
+        db.session.rollback()
+        current_app.logger.warning("Message search over budget for user %s", user_id)
+        return [], None, True
+
+    hits = [{
+        'kind': row.kind,
+        'message_id': row.message_id,
+        'sender_id': row.sender_id,
+        'sender_username': row.sender_username,
+        # The other side of a direct conversation, for linking to the chat
+        'partner_id': (row.recipient_id if row.sender_id == user_id else row.sender_id)
+        if row.kind == DIRECT else None,
+        'group_id': row.group_id,
+        'snippet': _snippet(row.snippet),
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    } for row in rows]
+    next_before = rows[-1].id if len(rows) == limit else None
+    return hits, next_before, False
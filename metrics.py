@@ -0,0 +1,226 @@
+"""In-process Prometheus metrics served at /metrics.
+
+The endpoint is off (404) unless METRICS_TOKEN is set, and then needs
+"Authorization: Bearer $METRICS_TOKEN". Every value lives in the memory of the process
+that serves the scrape: with WEB_CONCURRENCY > 1 each scrape reaches one gunicorn worker
+and sees only that worker's counters. Scrape a single-worker deployment per instance, or
+treat the numbers as one worker's sample of the traffic.
+"""
+import time
+import functools
+from bisect import bisect_left
+from flask import g, request, Response, abort, current_app
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Updates take no locks: a child's storage is allocated once per label set and then only
+# mutated in place. Under preemptive threads an increment can very rarely be lost, which
+# is acceptable for monitoring and keeps the hot path free of contention.
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        cell = self._values.get(labels)
+        if cell is None:
+            cell = self._values.setdefault(labels, [0])
+        cell[0] += amount
+
+    def samples(self):
+        for labels, cell in list(self._values.items()):
+            yield self.name, _format_labels(self.label_names, labels), cell[0]
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+    type = 'gauge'
+
+    def __init__(self, name, help, callback, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.callback = callback
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            if value is not None:
+                yield self.name, _format_labels(self.label_names, labels), value
+
+
+class _HistogramChild:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._children = {}
+
+    def observe(self, value, *labels):
+        child = self._children.get(labels)
+        if child is None:
+            # One extra slot for the +Inf bucket
+            child = self._children.setdefault(labels, _HistogramChild(len(self.buckets) + 1))
+        child.counts[bisect_left(self.buckets, value)] += 1
+        child.sum += value
+
+    def samples(self):
+        for labels, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket', _format_labels(self.label_names, labels, ('le', le)), cumulative
+            yield f'{self.name}_sum', _format_labels(self.label_names, labels), child.sum
+            yield f'{self.name}_count', _format_labels(self.label_names, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        # Re-registering a name (e.g. init_app on a second app) replaces the old metric
+        self.metrics = [existing for existing in self.metrics if existing.name != metric.name]
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HTTP_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', labels=('endpoint', 'method')))
+HTTP_REQUESTS = registry.register(Counter(
+    'http_requests_total', 'HTTP requests by endpoint and status', labels=('endpoint', 'method', 'status')))
+HTTP_ERRORS = registry.register(Counter(
+    'http_errors_total', 'HTTP responses with a 5xx status', labels=('endpoint',)))
+SOCKET_LATENCY = registry.register(Histogram(
+    'socketio_event_duration_seconds', 'Socket.IO handler latency by event', labels=('event',)))
+SOCKET_EVENTS = registry.register(Counter(
+    'socketio_events_total', 'Socket.IO events handled', labels=('event',)))
+SOCKET_ERRORS = registry.register(Counter(
+    'socketio_event_errors_total', 'Socket.IO handlers that raised', labels=('event',)))
+SOCKET_EMITS = registry.register(Counter(
+    'socketio_emits_total', 'Socket.IO messages emitted by event name', labels=('event',)))
+SOCKET_CONNECTIONS = registry.register(Counter(
+    'socketio_connections_total', 'Socket.IO connects and disconnects', labels=('kind',)))
+
+
+def count_emit(event, recipients=1):
+    SOCKET_EMITS.inc(event, amount=recipients)
+
+
+def track_event(name):
+    """Decorator timing one Socket.IO event handler"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            except Exception:
+                SOCKET_ERRORS.inc(name)
+                raise
+            finally:
+                SOCKET_EVENTS.inc(name)
+                SOCKET_LATENCY.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+
+def _pool_stats(db, app):
+    def collect():
+        with app.app_context():
+            pool = db.engine.pool
+        stats = {}
+        for key in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, key, None)
+            if callable(method):
+                stats[(key,)] = method()
+        return stats
+    return collect
+
+
+def _socket_stats(socketio):
+    def collect():
+        try:
+            rooms = socketio.server.manager.rooms.get('/', {})
+        except AttributeError:
+            return {}
+        # python-socketio keeps every connected sid in the None room and a private room per sid
+        connected = rooms.get(None, {})
+        named = [room for room in rooms if room is not None and room not in connected]
+        return {('connections',): len(connected), ('rooms',): len(named)}
+    return collect
+
+
+def init_app(app, db, socketio):
+    registry.register(Gauge('db_pool_connections', 'SQLAlchemy pool state', _pool_stats(db, app), labels=('state',)))
+    registry.register(Gauge('socketio_active', 'Connected Socket.IO clients and named rooms',
+                            _socket_stats(socketio), labels=('kind',)))
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, endpoint, request.method)
+            HTTP_REQUESTS.inc(endpoint, request.method, response.status_code)
+            if response.status_code >= 500:
+                HTTP_ERRORS.inc(endpoint)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        token = current_app.config['METRICS_TOKEN']
+        if not token:
+            abort(404)
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
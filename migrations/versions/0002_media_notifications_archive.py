@@ -0,0 +1,129 @@
+"""User media table, notification counters and retention archive tables
+
+Revision ID: 0002_media_notifications_archive
+Revises: 0001_baseline
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_media_notifications_archive'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_media',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_media_user_kind_id', 'user_media', ['user_id', 'kind', 'id'], unique=False)
+
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.add_column(sa.Column('sender_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('group_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_notification_sender_id_user', 'user', ['sender_id'], ['id'])
+        batch_op.create_foreign_key('fk_notification_group_id_chat_group', 'chat_group', ['group_id'], ['id'])
+    op.create_index('ix_notification_user_read_created', 'notification', ['user_id', 'is_read', 'created_at'], unique=False)
+    op.create_index('ix_notification_user_created_id', 'notification', ['user_id', 'created_at', 'id'], unique=False)
+
+    op.create_table('notification_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('related_id', sa.Integer(), nullable=True),
+        sa.Column('sender_id', sa.Integer(), nullable=True),
+        sa.Column('group_id', sa.Integer(), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_archive_user_id', 'notification_archive', ['user_id'], unique=False)
+    op.create_table('message_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('recipient_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('media_url', sa.String(length=500), nullable=True),
+        sa.Column('media_type', sa.String(length=50), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_message_archive_pair_created', 'message_archive', ['sender_id', 'recipient_id', 'created_at'], unique=False)
+    op.create_table('group_message_archive',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('media_url', sa.String(length=500), nullable=True),
+        sa.Column('media_type', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_group_message_archive_group_created', 'group_message_archive', ['group_id', 'created_at'], unique=False)
+
+    # Data: move the legacy JSON media lists into user_media rows
+    connection = op.get_bind()
+    user = sa.table('user',
+        sa.column('id', sa.Integer),
+        sa.column('activity_images', sa.JSON),
+        sa.column('uploaded_files', sa.JSON)
+    )
+    user_media = sa.table('user_media',
+        sa.column('user_id', sa.Integer),
+        sa.column('kind', sa.String),
+        sa.column('url', sa.String)
+    )
+    rows = []
+    for user_id, activity_images, uploaded_files in connection.execute(
+            sa.select(user.c.id, user.c.activity_images, user.c.uploaded_files)):
+        rows.extend({'user_id': user_id, 'kind': 'activity_image', 'url': url} for url in activity_images or [])
+        rows.extend({'user_id': user_id, 'kind': 'uploaded_file', 'url': url} for url in uploaded_files or [])
+    if rows:
+        op.bulk_insert(user_media, rows)
+
+    # Seed the cached counters from the existing unread rows
+    connection.execute(sa.text(
+        'UPDATE "user" SET unread_notifications = '
+        '(SELECT COUNT(*) FROM notification WHERE notification.user_id = "user".id AND notification.is_read = :false)'
+    ), {'false': False})
+
+
+def downgrade():
+    op.drop_index('ix_group_message_archive_group_created', table_name='group_message_archive')
+    op.drop_table('group_message_archive')
+    op.drop_index('ix_message_archive_pair_created', table_name='message_archive')
+    op.drop_table('message_archive')
+    op.drop_index('ix_notification_archive_user_id', table_name='notification_archive')
+    op.drop_table('notification_archive')
+
+    op.drop_index('ix_notification_user_created_id', table_name='notification')
+    op.drop_index('ix_notification_user_read_created', table_name='notification')
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.drop_constraint('fk_notification_group_id_chat_group', type_='foreignkey')
+        batch_op.drop_constraint('fk_notification_sender_id_user', type_='foreignkey')
+        batch_op.drop_column('group_id')
+        batch_op.drop_column('sender_id')
+
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('unread_notifications')
+
+    op.drop_index('ix_user_media_user_kind_id', table_name='user_media')
+    op.drop_table('user_media')
@@ -0,0 +1,42 @@
+"""Composite indexes for hot query shapes and unique friend-request pairs
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_media_notifications_archive
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_path_indexes'
+down_revision = '0002_media_notifications_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_message_sender_recipient_created', 'message', ['sender_id', 'recipient_id', 'created_at'], unique=False)
+    op.create_index('ix_message_recipient_read', 'message', ['recipient_id', 'is_read'], unique=False)
+    op.create_index('ix_group_message_group_created', 'group_message', ['group_id', 'created_at'], unique=False)
+    op.create_index('ix_friend_request_receiver_status', 'friend_request', ['receiver_id', 'status'], unique=False)
+    op.create_index('ix_group_membership_group_id', 'group_membership', ['group_id'], unique=False)
+    op.create_index('ix_user_latitude_longitude', 'user', ['latitude', 'longitude'], unique=False)
+
+    # Keep the oldest request of any duplicated pair before enforcing uniqueness
+    op.execute(
+        'DELETE FROM friend_request WHERE id NOT IN '
+        '(SELECT MIN(id) FROM friend_request GROUP BY sender_id, receiver_id)'
+    )
+    op.create_index('uq_friend_request_pair', 'friend_request', ['sender_id', 'receiver_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_friend_request_pair', table_name='friend_request')
+    op.drop_index('ix_user_latitude_longitude', table_name='user')
+    op.drop_index('ix_group_membership_group_id', table_name='group_membership')
+    op.drop_index('ix_friend_request_receiver_status', table_name='friend_request')
+    op.drop_index('ix_group_message_group_created', table_name='group_message')
+    op.drop_index('ix_message_recipient_read', table_name='message')
+    op.drop_index('ix_message_sender_recipient_created', table_name='message')
@@ -0,0 +1,46 @@
+"""Compiled privacy bitmask on user, backfilled from privacy_settings
+
+Revision ID: 0005_user_privacy_mask
+Revises: 0004_user_profile_version
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_user_privacy_mask'
+down_revision = '0004_user_profile_version'
+branch_labels = None
+depends_on = None
+
+# Mirrors serializers.PRIVACY_BITS at the time of this migration
+PRIVACY_BITS = {
+    'location_visible': 1,
+    'interests_visible': 2,
+    'bio_visible': 4,
+    'age_visible': 8,
+    'activities_visible': 16,
+    'availability_visible': 32,
+}
+ALL_VISIBLE = 63
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('privacy_mask', sa.Integer(), server_default=str(ALL_VISIBLE), nullable=False))
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('privacy_settings', sa.JSON),
+                    sa.column('privacy_mask', sa.Integer))
+    bind = op.get_bind()
+    for user_id, settings in bind.execute(sa.select(user.c.id, user.c.privacy_settings)):
+        settings = settings or {}
+        mask = sum(bit for key, bit in PRIVACY_BITS.items() if settings.get(key, True))
+        if mask != ALL_VISIBLE:
+            bind.execute(user.update().where(user.c.id == user_id).values(privacy_mask=mask))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('privacy_mask')
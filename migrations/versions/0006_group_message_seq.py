@@ -0,0 +1,52 @@
+"""Per-group message sequence numbers
+
+Revision ID: 0006_group_message_seq
+Revises: 0005_user_privacy_mask
+Create Date: 2026-10-19 14:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_group_message_seq'
+down_revision = '0005_user_privacy_mask'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_group') as batch_op:
+        batch_op.add_column(sa.Column('last_seq', sa.Integer(), server_default='0', nullable=False))
+    with op.batch_alter_table('group_message') as batch_op:
+        batch_op.add_column(sa.Column('seq', sa.Integer(), nullable=True))
+    with op.batch_alter_table('group_message_archive') as batch_op:
+        batch_op.add_column(sa.Column('seq', sa.Integer(), nullable=True))
+
+    # Number existing messages in their old display order; id breaks created_at ties
+    op.execute(
+        'UPDATE group_message SET seq = (SELECT numbered.rn FROM '
+        '(SELECT id, ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY created_at, id) AS rn '
+        'FROM group_message) numbered WHERE numbered.id = group_message.id)'
+    )
+    op.execute(
+        'UPDATE chat_group SET last_seq = COALESCE('
+        '(SELECT MAX(seq) FROM group_message WHERE group_message.group_id = chat_group.id), 0)'
+    )
+
+    with op.batch_alter_table('group_message') as batch_op:
+        batch_op.alter_column('seq', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_index('ix_group_message_group_created')
+        batch_op.create_index('uq_group_message_group_seq', ['group_id', 'seq'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('group_message') as batch_op:
+        batch_op.drop_index('uq_group_message_group_seq')
+        batch_op.create_index('ix_group_message_group_created', ['group_id', 'created_at'], unique=False)
+        batch_op.drop_column('seq')
+    with op.batch_alter_table('group_message_archive') as batch_op:
+        batch_op.drop_column('seq')
+    with op.batch_alter_table('chat_group') as batch_op:
+        batch_op.drop_column('last_seq')
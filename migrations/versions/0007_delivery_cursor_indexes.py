@@ -0,0 +1,28 @@
+"""Indexes for reconnect replay id range scans
+
+Revision ID: 0007_delivery_cursor_indexes
+Revises: 0006_group_message_seq
+Create Date: 2026-10-19 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_delivery_cursor_indexes'
+down_revision = '0006_group_message_seq'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_message_recipient_id', 'message', ['recipient_id', 'id'], unique=False)
+    op.create_index('ix_message_sender_id', 'message', ['sender_id', 'id'], unique=False)
+    op.create_index('ix_group_message_group_id', 'group_message', ['group_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_group_message_group_id', table_name='group_message')
+    op.drop_index('ix_message_sender_id', table_name='message')
+    op.drop_index('ix_message_recipient_id', table_name='message')
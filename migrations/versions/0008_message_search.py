@@ -0,0 +1,78 @@
+"""Full-text search index over direct and group messages
+
+Revision ID: 0008_message_search
+Revises: 0007_delivery_cursor_indexes
+Create Date: 2026-10-19 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_message_search'
+down_revision = '0007_delivery_cursor_indexes'
+branch_labels = None
+depends_on = None
+
+# Same statements as models.MESSAGE_SEARCH_DDL at the time of this revision
+TEXT_INDEX_DDL = {
+    'postgresql': [
+        "ALTER TABLE message_search ADD COLUMN document tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+        "CREATE INDEX ix_message_search_document ON message_search USING GIN (document)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_search_fts USING fts5("
+        "content, content='message_search', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER message_search_ai AFTER INSERT ON message_search BEGIN "
+        "INSERT INTO message_search_fts(rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER message_search_ad AFTER DELETE ON message_search BEGIN "
+        "INSERT INTO message_search_fts(message_search_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER message_search_au AFTER UPDATE OF content ON message_search BEGIN "
+        "INSERT INTO message_search_fts(message_search_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO message_search_fts(rowid, content) VALUES (new.id, new.content); END",
+    ],
+}
+
+
+def upgrade():
+    op.create_table('message_search',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('recipient_id', sa.Integer(), nullable=True),
+        sa.Column('group_id', sa.Integer(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_message_search_kind_message', 'message_search', ['kind', 'message_id'], unique=True)
+    op.create_index('ix_message_search_sender_id', 'message_search', ['sender_id', 'id'], unique=False)
+    op.create_index('ix_message_search_recipient_id', 'message_search', ['recipient_id', 'id'], unique=False)
+    op.create_index('ix_message_search_group_id', 'message_search', ['group_id', 'id'], unique=False)
+    for statement in TEXT_INDEX_DDL.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
+
+    # Index existing history oldest first, so ids follow message order like new rows will
+    op.execute(
+        "INSERT INTO message_search (kind, message_id, sender_id, recipient_id, group_id, content, created_at) "
+        "SELECT kind, message_id, sender_id, recipient_id, group_id, content, created_at FROM ("
+        "SELECT 'direct' AS kind, id AS message_id, sender_id, recipient_id, NULL AS group_id, content, created_at "
+        "FROM message WHERE content <> '' "
+        "UNION ALL "
+        "SELECT 'group', id, sender_id, NULL, group_id, content, created_at "
+        "FROM group_message WHERE content <> ''"
+        ") AS history ORDER BY created_at, message_id"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS message_search_fts')
+    op.drop_index('ix_message_search_group_id', table_name='message_search')
+    op.drop_index('ix_message_search_recipient_id', table_name='message_search')
+    op.drop_index('ix_message_search_sender_id', table_name='message_search')
+    op.drop_index('uq_message_search_kind_message', table_name='message_search')
+    op.drop_table('message_search')
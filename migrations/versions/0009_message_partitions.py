@@ -0,0 +1,116 @@
+"""Partition message and group_message by month on Postgres
+
+Revision ID: 0009_message_partitions
+Revises: 0008_message_search
+Create Date: 2026-10-19 18:20:00.000000
+
+"""
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_message_partitions'
+down_revision = '0008_message_search'
+branch_labels = None
+depends_on = None
+
+# Partitions created past the current month; `flask partitions` keeps extending them
+MONTHS_AHEAD = 3
+
+FOREIGN_KEYS = {
+    'message': [('sender_id', '"user"'), ('recipient_id', '"user"')],
+    'group_message': [('group_id', 'chat_group'), ('sender_id', '"user"')],
+}
+
+# Recreated on the new table; on a partitioned table a unique index must include created_at
+INDEXES = {
+    'message': [
+        ('ix_message_sender_recipient_created', ['sender_id', 'recipient_id', 'created_at'], False),
+        ('ix_message_recipient_read', ['recipient_id', 'is_read'], False),
+        ('ix_message_recipient_id', ['recipient_id', 'id'], False),
+        ('ix_message_sender_id', ['sender_id', 'id'], False),
+    ],
+    'group_message': [
+        ('uq_group_message_group_seq', ['group_id', 'seq', 'created_at'], True),
+        ('ix_group_message_group_id', ['group_id', 'id'], False),
+    ],
+}
+
+
+def _month(value, offset=0):
+    index = value.year * 12 + value.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _swap_table(table, partitioned):
+    """Rebuild table as a (partitioned or plain) copy of itself and move its rows across"""
+    old = f'{table}_old'
+    bind = op.get_bind()
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    op.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey')
+    for name, columns, unique in INDEXES[table]:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+
+    key = 'id, created_at' if partitioned else 'id'
+    suffix = ' PARTITION BY RANGE (created_at)' if partitioned else ''
+    op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS){suffix}')
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN created_at {"SET" if partitioned else "DROP"} NOT NULL')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({key})')
+    for column, target in FOREIGN_KEYS[table]:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey '
+                   f'FOREIGN KEY ({column}) REFERENCES {target} (id)')
+
+    if partitioned:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        oldest = bind.execute(sa.text(f'SELECT MIN(created_at) FROM {old}')).scalar() or now
+        start, last = _month(oldest), _month(now, MONTHS_AHEAD)
+        while start <= last:
+            end = _month(start, 1)
+            op.execute(f"CREATE TABLE {table}_y{start.year}m{start.month:02d} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+            start = end
+        # Catches rows past the last monthly partition if rollover stops running;
+        # partitions.ensure_partitions moves them out when it creates their month
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    # The id sequence moves to the new table before the old one (its owner) is dropped
+    sequence = bind.execute(sa.text('SELECT pg_get_serial_sequence(:table, :column)'),
+                            {'table': old, 'column': 'id'}).scalar()
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    op.execute(f'DROP TABLE {old}')
+
+    for name, columns, unique in INDEXES[table]:
+        if not partitioned and name == 'uq_group_message_group_seq':
+            columns = ['group_id', 'seq']
+        op.create_index(name, table, columns, unique=unique)
+
+
+def upgrade():
+    for table in ('message', 'group_message'):
+        op.execute(f'UPDATE {table} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in ('message', 'group_message'):
+            _swap_table(table, partitioned=True)
+    else:
+        for table in ('message', 'group_message'):
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index('ix_group_message_archive_group_seq', 'group_message_archive', ['group_id', 'seq'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_group_message_archive_group_seq', table_name='group_message_archive')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in ('group_message', 'message'):
+            _swap_table(table, partitioned=False)
+    else:
+        for table in ('group_message', 'message'):
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
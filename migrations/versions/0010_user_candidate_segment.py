@@ -0,0 +1,51 @@
+"""Suggestion segment columns and index on user
+
+Revision ID: 0010_user_candidate_segment
+Revises: 0009_message_partitions
+Create Date: 2026-10-19 19:05:00.000000
+
+"""
+import math
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_user_candidate_segment'
+down_revision = '0009_message_partitions'
+branch_labels = None
+depends_on = None
+
+# Mirror candidates.AGE_BUCKET_YEARS / GEO_CELL_DEGREES at the time of this migration
+AGE_BUCKET_YEARS = 10
+GEO_CELL_DEGREES = 1.0
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('age_bucket', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('geo_cell', sa.String(length=32), nullable=True))
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('age', sa.Integer),
+                    sa.column('latitude', sa.Float), sa.column('longitude', sa.Float),
+                    sa.column('age_bucket', sa.Integer), sa.column('geo_cell', sa.String))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(user.c.id, user.c.age, user.c.latitude, user.c.longitude).where(
+        sa.or_(user.c.age.isnot(None), user.c.latitude.isnot(None))
+    )).all()
+    for user_id, age, latitude, longitude in rows:
+        cell = None
+        if latitude is not None and longitude is not None:
+            cell = '%d:%d' % (math.floor(latitude / GEO_CELL_DEGREES), math.floor(longitude / GEO_CELL_DEGREES))
+        bind.execute(user.update().where(user.c.id == user_id).values(
+            age_bucket=age // AGE_BUCKET_YEARS if age is not None else None, geo_cell=cell))
+
+    op.create_index('ix_user_candidate_segment', 'user',
+                    ['looking_for', 'availability', 'age_bucket', 'geo_cell'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_candidate_segment', table_name='user')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('geo_cell')
+        batch_op.drop_column('age_bucket')
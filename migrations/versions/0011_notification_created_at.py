@@ -0,0 +1,27 @@
+"""Make notification.created_at non-null for the feed cursor
+
+Revision ID: 0011_notification_created_at
+Revises: 0010_user_candidate_segment
+Create Date: 2026-10-19 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_notification_created_at'
+down_revision = '0010_user_candidate_segment'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('UPDATE notification SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,32 @@
+"""Include created_at in uq_group_message_group_seq everywhere
+
+Revision ID: 0012_group_message_seq_index
+Revises: 0011_notification_created_at
+Create Date: 2026-10-19 21:40:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_group_message_seq_index'
+down_revision = '0011_notification_created_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Postgres got these columns with the partitioned table in 0009
+    if op.get_bind().dialect.name == 'postgresql':
+        return
+    with op.batch_alter_table('group_message') as batch_op:
+        batch_op.drop_index('uq_group_message_group_seq')
+        batch_op.create_index('uq_group_message_group_seq', ['group_id', 'seq', 'created_at'], unique=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        return
+    with op.batch_alter_table('group_message') as batch_op:
+        batch_op.drop_index('uq_group_message_group_seq')
+        batch_op.create_index('uq_group_message_group_seq', ['group_id', 'seq'], unique=True)
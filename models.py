@@ -1,16 +1,17 @@
 from flask_login import UserMixin
 from time import time
 from datetime import datetime, timezone
-import jwt
 import random
 import string
 import os
-from werkzeug.utils import secure_filename
-from PIL import Image
-import io
-from database import db
+import copy
+from database import db, RoutingSession
 import math
+import caching
+import profiling
+from sqlalchemy import event, DDL, inspect
 from sqlalchemy.sql import func
+from sqlalchemy.orm import deferred, load_only, make_transient_to_detached
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.dialects.postgresql import JSONB
 
@@ -22,6 +23,12 @@ class FriendRequest(db.Model):
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        db.Index('ix_friend_request_receiver_status', 'receiver_id', 'status'),
+        # One request per direction; also serves the (sender_id, receiver_id) lookup
+        db.Index('uq_friend_request_pair', 'sender_id', 'receiver_id', unique=True),
+    )
+
     # Add relationship to User model
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_requests')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_requests')
@@ -29,6 +36,12 @@ class FriendRequest(db.Model):
     def __repr__(self):
         return f'<FriendRequest {self.sender_id} -> {self.receiver_id} ({self.status})>'
 
+# Loaded column values of users by id, for load_user; see User.load_cached
+user_rows = caching.store('users', ttl=30)
+# Ranked (user id, score) suggestion lists; see get_friend_suggestions
+suggestion_lists = caching.store('suggestions', ttl=120)
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -37,7 +50,8 @@ class User(UserMixin, db.Model):
     reset_token = db.Column(db.String(500), unique=True)
     reset_token_expiry = db.Column(db.DateTime)
     profile_picture = db.Column(db.String(200))
-    bio = db.Column(db.Text)
+    # Heavy columns are deferred so list/scan queries don't pull them by default
+    bio = deferred(db.Column(db.Text))
     interests = db.Column(db.Text)
     location = db.Column(db.String(120))
     latitude = db.Column(db.Float)
@@ -54,11 +68,26 @@ class User(UserMixin, db.Model):
         'activities_visible': True,
         'availability_visible': True
     })
-    uploaded_files = db.Column(db.JSON, default=[])
-    activity_images = db.Column(db.JSON, default=[])  # Store list of activity image URLs
+    # privacy_settings compiled by serializers.compile_privacy; set both through set_privacy_settings
+    privacy_mask = db.Column(db.Integer, default=63, server_default='63', nullable=False)
+    # Legacy JSON media lists, superseded by the UserMedia table (copied over in migration 0002)
+    uploaded_files = deferred(db.Column(db.JSON, default=[]))
+    activity_images = deferred(db.Column(db.JSON, default=[]))
     otp_code = db.Column(db.String(6))
     otp_expiry = db.Column(db.DateTime)
     last_active = db.Column(db.DateTime, default=func.now())
+    # Cached count of unread Notification rows, maintained by notifications.py
+    unread_notifications = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped whenever card-visible profile data changes; part of the rendered-card cache key
+    profile_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Suggestion segment beside looking_for and availability, maintained by update_segment
+    age_bucket = db.Column(db.Integer)
+    geo_cell = db.Column(db.String(32))
+
+    __table_args__ = (
+        db.Index('ix_user_latitude_longitude', 'latitude', 'longitude'),
+        db.Index('ix_user_candidate_segment', 'looking_for', 'availability', 'age_bucket', 'geo_cell'),
+    )
 
     # Relationships for friend suggestions
     sent_matches = db.relationship(
@@ -82,6 +111,78 @@ class User(UserMixin, db.Model):
         lazy='dynamic'
     )
 
+    # Columns read by get_match_score and the suggestion/request cards
+    CARD_COLUMNS = ('id', 'username', 'profile_picture', 'location', 'latitude', 'longitude',
+                    'age', 'looking_for', 'interests', 'activities', 'availability',
+                    'privacy_mask', 'last_active', 'profile_version')
+    # Columns read by friend lists, the map and chat partner lists
+    SUMMARY_COLUMNS = ('id', 'username', 'profile_picture', 'latitude', 'longitude', 'last_active',
+                       'profile_version', 'privacy_mask')
+
+    # Written on most requests but never read through a cached row, so not worth invalidating it
+    UNCACHED_CHANGES = ('last_active',)
+    # Writes of only these don't keep the user's reads on the primary (database._mark_write)
+    NON_STICKY_CHANGES = ('last_active',)
+    # Never copied into the shared cache; they load from the database when read
+    CREDENTIAL_COLUMNS = ('password_hash', 'otp_code', 'otp_expiry', 'reset_token', 'reset_token_expiry')
+
+    @classmethod
+    def load_columns(cls, names):
+        """Loader option restricting a User query to the given column names"""
+        return load_only(*[getattr(cls, name) for name in names])
+
+    @classmethod
+    def load_cached(cls, user_id):
+        """The user, attached to the session from cached column values when possible.
+
+        Deferred and credential columns aren't cached and load on first access as usual.
+        """
+        values = user_rows.get(user_id)
+        if values is caching.MISSING:
+            generation = user_rows.generation
+            user = db.session.get(cls, user_id)
+            if user is not None:
+                loaded = inspect(user).dict
+                user_rows.put(user_id, {attr.key: loaded[attr.key] for attr in inspect(cls).column_attrs
+                                        if attr.key in loaded and attr.key not in cls.CREDENTIAL_COLUMNS},
+                              generation=generation)
+            return user
+
+        user = cls(**copy.deepcopy(values))
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def get_media(self, kind, limit=20, before_id=None):
+        """Page through this user's media newest first; pass the last id seen as before_id"""
+        query = UserMedia.query.filter_by(user_id=self.id, kind=kind)
+        if before_id:
+            query = query.filter(UserMedia.id < before_id)
+        return query.order_by(UserMedia.id.desc()).limit(limit).all()
+
+    def set_privacy_settings(self, settings):
+        """Store privacy settings together with the bitmask serializers read"""
+        import serializers
+        self.privacy_settings = settings
+        self.privacy_mask = serializers.compile_privacy(settings)
+
+    def touch_profile(self):
+        """Mark card-visible profile data as changed and drop this user's rendered cards"""
+        import fragment_cache
+        self.profile_version = (self.profile_version or 0) + 1
+        self.update_segment()
+        fragment_cache.invalidate_user(self.id)
+
+    def update_segment(self):
+        """Refile this user under the suggestion segment of their age and location"""
+        import candidates
+        for name, value in candidates.segment(self.age, self.latitude, self.longitude).items():
+            setattr(self, name, value)
+
+    def add_media(self, kind, url):
+        """Record a new media item for this user (caller commits)"""
+        media = UserMedia(user_id=self.id, kind=kind, url=url)
+        db.session.add(media)
+        return media
 
     def get_match_score(self, other_user):
         """Calculate match score with another user based on various factors"""
@@ -134,9 +235,22 @@ class User(UserMixin, db.Model):
         c = 2 * math.asin(math.sqrt(a))
         return R * c
 
+    @profiling.timed('get_friend_suggestions')
     def get_friend_suggestions(self, limit=10, filters=None):
-        """Get friend suggestions sorted by match score with optional filters"""
-        query = User.query.filter(
+        """Get friend suggestions sorted by match score with optional filters.
+
+        Only candidates from compatible segments are scored, see candidates.py. The ranking
+        is cached briefly per (profile version, location cell, limit, filters).
+        """
+        import candidates
+        key = (self.id, self.profile_version, self.geo_cell, limit, frozenset((filters or {}).items()))
+        ranked = suggestion_lists.get(key)
+        if ranked is not caching.MISSING:
+            users = {user.id: user for user in User.query.options(User.load_columns(User.CARD_COLUMNS)).filter(
+                User.id.in_([user_id for user_id, score in ranked]))}
+            return [(users[user_id], score) for user_id, score in ranked if user_id in users]
+
+        query = User.query.options(User.load_columns(User.CARD_COLUMNS)).filter(
             User.id != self.id
         )
 
@@ -179,7 +293,7 @@ class User(UserMixin, db.Model):
                     User.longitude.between(self.longitude - lng_range, self.longitude + lng_range)
                 )
 
-        potential_friends = query.all()
+        potential_friends = candidates.select(self, query, limit)
 
         # Calculate scores for filtered matches
         scored_matches = [
@@ -189,6 +303,7 @@ class User(UserMixin, db.Model):
 
         # Sort by score and return top matches
         scored_matches.sort(key=lambda x: x[1], reverse=True)
+        suggestion_lists.put(key, [(user.id, score) for user, score in scored_matches[:limit]])
         return scored_matches[:limit]
 
     # Update the relationship to avoid circular backref
@@ -199,31 +314,73 @@ class User(UserMixin, db.Model):
         secondaryjoin='ChatGroup.id==group_membership.c.group_id',
         lazy='dynamic'
     )
-    notifications = db.relationship('Notification', backref='user', lazy='dynamic')
+    notifications = db.relationship('Notification', foreign_keys='Notification.user_id',
+                                    backref='user', lazy='dynamic')
 
     def get_unread_messages_count(self):
         return Message.query.filter_by(recipient_id=self.id, is_read=False).count()
 
     def is_friend_with(self, user):
         """Check if the current user is friends with the given user"""
-        return self.friends.filter_by(id=user.id).first() is not None
+        import friendships
+        return user.id in friendships.friend_ids(self.id)
 
     def add_friend(self, user):
         """Add a user as friend"""
+        import friendships
         if not self.is_friend_with(user):
             self.friends.append(user)
             user.friends.append(self)
+            friendships.invalidate(self.id, user.id)
             return True
         return False
 
     def remove_friend(self, user):
         """Remove a user from friends"""
+        import friendships
         if self.is_friend_with(user):
             self.friends.remove(user)
             user.friends.remove(self)
+            friendships.invalidate(self.id, user.id)
             return True
         return False
 
+@event.listens_for(RoutingSession, 'after_flush')
+def _invalidate_cached_users(session, flush_context):
+    """Drop cached rows of users whose columns this flush changed, once it commits"""
+    changed = set()
+    for user in list(session.dirty) + list(session.deleted):
+        if isinstance(user, User):
+            state = inspect(user)
+            if any(state.attrs[attr.key].history.has_changes() for attr in inspect(User).column_attrs
+                   if attr.key not in User.UNCACHED_CHANGES):
+                changed.add(user.id)
+    if changed:
+        caching.invalidate('users', *changed, session=session)
+
+
+class UserMedia(db.Model):
+    """Activity images and uploaded files, one row per item"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'activity_image', 'uploaded_file'
+    url = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=func.now())
+
+    __table_args__ = (
+        db.Index('ix_user_media_user_kind_id', 'user_id', 'kind', 'id'),
+    )
+
+    ACTIVITY_IMAGE = 'activity_image'
+    UPLOADED_FILE = 'uploaded_file'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class UserMatch(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -250,7 +407,16 @@ class Message(db.Model):
     media_url = db.Column(db.String(500))  # For storing media file URLs
     media_type = db.Column(db.String(50))  # 'image', 'video', or 'voice'
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=func.now())
+    # Partition key on Postgres (monthly ranges, see partitions.py)
+    created_at = db.Column(db.DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_message_sender_recipient_created', 'sender_id', 'recipient_id', 'created_at'),
+        db.Index('ix_message_recipient_read', 'recipient_id', 'is_read'),
+        # Id range scans per user for reconnect replay, see delivery.py
+        db.Index('ix_message_recipient_id', 'recipient_id', 'id'),
+        db.Index('ix_message_sender_id', 'sender_id', 'id'),
+    )
 
     # Relationships
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
@@ -259,15 +425,29 @@ class Message(db.Model):
     def __repr__(self):
         return f'<Message {self.id}: {self.sender_id} -> {self.recipient_id}>'
 
+    def to_dict(self, sender_username=None):
+        return {
+            'id': self.id,
+            'sender_id': self.sender_id,
+            'recipient_id': self.recipient_id,
+            'content': self.content,
+            'media_url': self.media_url,
+            'media_type': self.media_type,
+            'created_at': self.created_at.isoformat(),
+            'sender_username': sender_username or self.sender.username
+        }
+
 # Fix for the ChatGroup model - removing circular backref
 class ChatGroup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=func.now())
+    # Highest GroupMessage.seq handed out in this group, see group_messages.next_seq
+    last_seq = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     creator = db.relationship('User', foreign_keys=[created_by])
 
-    settings = db.Column(JSONB, default={
+    settings = db.Column(db.JSON().with_variant(JSONB, 'postgresql'), default={
         'allow_media': True,
         'max_members': 50
     })
@@ -288,7 +468,8 @@ class ChatGroup(db.Model):
 group_membership = db.Table('group_membership',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
     db.Column('group_id', db.Integer, db.ForeignKey('chat_group.id'), primary_key=True),
-    db.Column('joined_at', db.DateTime, default=func.now())
+    db.Column('joined_at', db.DateTime, default=func.now()),
+    db.Index('ix_group_membership_group_id', 'group_id')
 )
 
 class GroupMessage(db.Model):
@@ -298,7 +479,18 @@ class GroupMessage(db.Model):
     content = db.Column(db.Text, nullable=False)
     media_url = db.Column(db.String(500))
     media_type = db.Column(db.String(50))
-    created_at = db.Column(db.DateTime, default=func.now())
+    # Partition key on Postgres (monthly ranges, see partitions.py)
+    created_at = db.Column(db.DateTime, default=func.now(), nullable=False)
+    # 1, 2, 3... within the group; gives history a stable order without created_at ties
+    seq = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # A unique index on a partitioned table must include the partition key, so this
+        # can't enforce one seq per group by itself; group_messages.next_seq does, by
+        # taking each number from the group row under its lock.
+        db.Index('uq_group_message_group_seq', 'group_id', 'seq', 'created_at', unique=True),
+        db.Index('ix_group_message_group_id', 'group_id', 'id'),
+    )
 
     # Relationships
     group = db.relationship('ChatGroup', backref='messages')
@@ -308,8 +500,128 @@ class GroupMessage(db.Model):
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    type = db.Column(db.String(50), nullable=False)  # 'message', 'friend_request', 'nearby_friend'
+    type = db.Column(db.String(50), nullable=False)  # 'message', 'group_message', 'friend_request', 'nearby_friend'
     content = db.Column(db.Text, nullable=False)
     related_id = db.Column(db.Integer)  # ID of related entity (message_id, friend_request_id, etc.)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # User who triggered the notification
+    group_id = db.Column(db.Integer, db.ForeignKey('chat_group.id'))  # Group for group_message notifications
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=func.now())
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'is_read', 'created_at'),
+        db.Index('ix_notification_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+
+    @classmethod
+    def group_key(cls):
+        """SQL columns notifications collapse on in the feed: (type, group or sender)"""
+        return (
+            cls.type,
+            db.case((cls.group_id.isnot(None), 'group'), (cls.sender_id.isnot(None), 'user'),
+                    else_='notification').label('key_kind'),
+            db.func.coalesce(cls.group_id, cls.sender_id, cls.id).label('key_id'),
+        )
+
+
+class MessageSearch(db.Model):
+    """Full-text index row for one direct or group message, see message_search.py"""
+    __tablename__ = 'message_search'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'direct' or 'group'
+    message_id = db.Column(db.Integer, nullable=False)
+    sender_id = db.Column(db.Integer, nullable=False)
+    recipient_id = db.Column(db.Integer)  # Direct messages
+    group_id = db.Column(db.Integer)  # Group messages
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('uq_message_search_kind_message', 'kind', 'message_id', unique=True),
+        db.Index('ix_message_search_sender_id', 'sender_id', 'id'),
+        db.Index('ix_message_search_recipient_id', 'recipient_id', 'id'),
+        db.Index('ix_message_search_group_id', 'group_id', 'id'),
+    )
+
+
+# The text index itself is backend specific: a generated tsvector column with a GIN index on
+# Postgres, and an FTS5 table kept in step by triggers on SQLite. Migration 0008 runs the same DDL.
+MESSAGE_SEARCH_DDL = {
+    'postgresql': [
+        "ALTER TABLE message_search ADD COLUMN document tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+        "CREATE INDEX ix_message_search_document ON message_search USING GIN (document)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_search_fts USING fts5("
+        "content, content='message_search', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER message_search_ai AFTER INSERT ON message_search BEGIN "
+        "INSERT INTO message_search_fts(rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER message_search_ad AFTER DELETE ON message_search BEGIN "
+        "INSERT INTO message_search_fts(message_search_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER message_search_au AFTER UPDATE OF content ON message_search BEGIN "
+        "INSERT INTO message_search_fts(message_search_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO message_search_fts(rowid, content) VALUES (new.id, new.content); END",
+    ],
+}
+
+for _dialect, _statements in MESSAGE_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(MessageSearch.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+event.listen(MessageSearch.__table__, 'after_drop',
+             DDL('DROP TABLE IF EXISTS message_search_fts').execute_if(dialect='sqlite'))
+
+
+# Archive tables for the retention job (retention.py). Column names mirror the live
+# tables so rows can be moved with a single INSERT ... SELECT per batch.
+class NotificationArchive(db.Model):
+    __tablename__ = 'notification_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    type = db.Column(db.String(50), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    related_id = db.Column(db.Integer)
+    sender_id = db.Column(db.Integer)
+    group_id = db.Column(db.Integer)
+    is_read = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=func.now())
+
+
+class MessageArchive(db.Model):
+    __tablename__ = 'message_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, nullable=False)
+    recipient_id = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    media_url = db.Column(db.String(500))
+    media_type = db.Column(db.String(50))
+    is_read = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=func.now())
+
+    __table_args__ = (
+        db.Index('ix_message_archive_pair_created', 'sender_id', 'recipient_id', 'created_at'),
+    )
+
+
+class GroupMessageArchive(db.Model):
+    __tablename__ = 'group_message_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, nullable=False)
+    sender_id = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    media_url = db.Column(db.String(500))
+    media_type = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
+    seq = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, default=func.now())
+
+    __table_args__ = (
+        db.Index('ix_group_message_archive_group_created', 'group_id', 'created_at'),
+        db.Index('ix_group_message_archive_group_seq', 'group_id', 'seq'),
+    )
+
+    # No foreign keys on archive tables; joined for rendering old history like GroupMessage
+    sender = db.relationship('User', primaryjoin='foreign(GroupMessageArchive.sender_id) == User.id',
+                             viewonly=True)
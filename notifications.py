@@ -0,0 +1,157 @@
+from datetime import datetime
+from database import db
+from models import User, Notification
+import caching
+
+# Upper bound on raw notification rows read for one feed page
+MAX_FEED_PAGE = 100
+
+
+def notify(user_ids, type, content, sender_id=None, group_id=None, related_id=None):
+    """Create notifications for the given users and bump their unread counters.
+
+    Adds the rows to the session and issues a single counter UPDATE; the caller commits.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+
+    notifications = [
+        Notification(
+            user_id=user_id,
+            type=type,
+            content=content,
+            sender_id=sender_id,
+            group_id=group_id,
+            related_id=related_id
+        )
+        for user_id in user_ids
+    ]
+    db.session.add_all(notifications)
+
+    User.query.filter(User.id.in_(user_ids)).update(
+        {User.unread_notifications: User.unread_notifications + 1},
+        synchronize_session=False
+    )
+    # Bulk UPDATEs bypass the flush hook that keeps cached user rows current
+    caching.invalidate('users', *user_ids)
+    return notifications
+
+
+def mark_read(user, ids=None, type=None, sender_id=None, group_id=None):
+    """Mark the user's unread notifications as read and decrement the cached counter.
+
+    With no filters every unread notification is marked. Returns the number of rows changed;
+    the caller commits.
+    """
+    query = Notification.query.filter_by(user_id=user.id, is_read=False)
+    if ids is not None:
+        query = query.filter(Notification.id.in_(ids))
+    if type:
+        query = query.filter_by(type=type)
+    if sender_id:
+        query = query.filter_by(sender_id=sender_id)
+    if group_id:
+        query = query.filter_by(group_id=group_id)
+
+    changed = query.update({Notification.is_read: True}, synchronize_session=False)
+    if changed:
+        User.query.filter_by(id=user.id).update(
+            {User.unread_notifications: db.case(
+                (User.unread_notifications > changed, User.unread_notifications - changed),
+                else_=0
+            )},
+            synchronize_session=False
+        )
+        db.session.expire(user, ['unread_notifications'])
+        caching.invalidate('users', user.id)
+    return changed
+
+
+def recount_unread(user):
+    """Rebuild the cached unread counter from the table (repair path, not used per request)"""
+    user.unread_notifications = Notification.query.filter_by(user_id=user.id, is_read=False).count()
+    return user.unread_notifications
+
+
+def encode_cursor(created_at, notification_id):
+    return f"{created_at.isoformat()},{notification_id}"
+
+
+def decode_cursor(cursor):
+    """Parse a feed cursor; returns (created_at, id) or None if it is malformed"""
+    try:
+        created_at, notification_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_feed(user, limit=20, cursor=None, unread_only=False):
+    """Return one keyset-paginated page of the user's notification feed.
+
+    Notifications are collapsed by (type, sender or group) in SQL, so "12 new messages
+    from X" is a single entry however many pages back they go. Entries are ordered newest
+    first on (latest created_at, latest id) and the cursor points into that order; an
+    entry that gets a new notification moves to the top and drops out of later pages.
+    """
+    limit = max(1, min(limit, MAX_FEED_PAGE))
+    filters = [Notification.user_id == user.id]
+    if unread_only:
+        filters.append(Notification.is_read.isnot(True))
+
+    key = Notification.group_key()
+    latest_at = db.func.max(Notification.created_at)
+    latest_id = db.func.max(Notification.id)
+    query = db.select(
+        *key,
+        db.func.count().label('count'),
+        db.func.sum(db.case((Notification.is_read.is_(True), 0), else_=1)).label('unread_count'),
+        latest_at.label('latest_at'),
+        latest_id.label('latest_id'),
+    ).where(*filters).group_by(*key)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, notification_id = position
+        query = query.having(db.or_(
+            latest_at < created_at,
+            db.and_(latest_at == created_at, latest_id < notification_id)
+        ))
+
+    rows = db.session.execute(query.order_by(latest_at.desc(), latest_id.desc()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return {'items': [], 'next_cursor': None, 'unread_total': user.unread_notifications}
+
+    # The newest notification of each entry supplies its sender, group and text
+    latest = {notification.id: notification for notification in Notification.query.filter(
+        Notification.id.in_([row.latest_id for row in rows]))}
+    ids = {}
+    for notification_id, *group in db.session.execute(db.select(Notification.id, *key).where(
+            *filters, db.or_(*[db.and_(*[column == value for column, value in zip(key, row[:3])])
+                               for row in rows])
+    ).order_by(Notification.id.desc())):
+        ids.setdefault(tuple(group), []).append(notification_id)
+
+    items = []
+    for row in rows:
+        newest = latest[row.latest_id]
+        items.append({
+            'type': row.type,
+            'sender_id': newest.sender_id,
+            'group_id': newest.group_id,
+            'content': newest.content,
+            'latest_at': row.latest_at.isoformat(),
+            'count': row.count,
+            'unread_count': row.unread_count,
+            'ids': ids.get(tuple(row[:3]), []),
+        })
+
+    last = rows[-1]
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(last.latest_at, last.latest_id) if has_more else None,
+        'unread_total': user.unread_notifications
+    }
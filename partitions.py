@@ -0,0 +1,105 @@
+"""Monthly time partitioning of message history, with a hot/cold split.
+
+On Postgres, message and group_message are range-partitioned by created_at with one
+partition per calendar month (migration 0009). rollover() creates the coming months'
+partitions ahead of time; rows that landed in the DEFAULT partition meanwhile are moved into
+the new month's partition. SQLite can't partition, so there rollover() moves whole cold
+months into the archive tables instead. Either way the default read paths only look at
+created_at >= hot_cutoff(), so Postgres prunes every older partition. Older history is
+read only when the user asks for it.
+"""
+import logging
+from datetime import datetime, timezone
+from flask import current_app
+from database import db
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ('message', 'group_message')
+
+
+def month_start(value, months_back=0):
+    """Midnight on the first of value's month, months_back months earlier"""
+    index = value.year * 12 + value.month - 1 - months_back
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def hot_cutoff():
+    """Start of the oldest hot month; created_at is stored naive in UTC"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return month_start(now, current_app.config['MESSAGE_HOT_MONTHS'] - 1)
+
+
+def hot(column):
+    """Filter keeping rows in the hot months, which Postgres resolves to the recent partitions"""
+    return column >= hot_cutoff()
+
+
+def partition_name(table, start):
+    return f'{table}_y{start.year}m{start.month:02d}'
+
+
+def default_partition(table):
+    """The catch-all partition migration 0009 creates for rows no monthly partition covers"""
+    return f'{table}_default'
+
+
+def _create_partition(table, name, start, end, has_default):
+    """Create one monthly partition, first moving any of its rows out of the default one.
+
+    Postgres refuses to create a partition whose range matches rows in the default
+    partition, so those are taken out of it while it is detached (all in this transaction).
+    """
+    default = default_partition(table)
+    bounds = {'start': start, 'end': end}
+    in_range = 'created_at >= :start AND created_at < :end'
+    stranded = has_default and db.session.execute(db.text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"), bounds).scalar()
+    if stranded:
+        db.session.execute(db.text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    db.session.execute(db.text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    if not stranded:
+        return 0
+    moved = db.session.execute(db.text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {table} SELECT * FROM moved"), bounds).rowcount
+    db.session.execute(db.text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    logger.warning("Moved %s rows of %s from %s into new partition %s; rollover fell behind",
+                   moved, table, default, name)
+    return moved
+
+
+def ensure_partitions(months_ahead):
+    """Create this month's and the next months_ahead months' partitions that don't exist yet"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    existing = set(db.session.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname IN :tables"
+    ).bindparams(db.bindparam('tables', expanding=True)), {'tables': list(PARTITIONED_TABLES)}).scalars())
+
+    created = []
+    for offset in range(months_ahead + 1):
+        start = month_start(now, -offset)
+        end = month_start(now, -offset - 1)
+        for table in PARTITIONED_TABLES:
+            name = partition_name(table, start)
+            if name in existing:
+                continue
+            _create_partition(table, name, start, end, default_partition(table) in existing)
+            created.append(name)
+    db.session.commit()
+    return created
+
+
+def rollover(months_ahead=None):
+    """Prepare upcoming partitions (Postgres) or archive cold months (SQLite); returns stats"""
+    if db.engine.dialect.name == 'postgresql':
+        if months_ahead is None:
+            months_ahead = current_app.config['MESSAGE_PARTITIONS_AHEAD']
+        return {'created_partitions': ensure_partitions(months_ahead)}
+
+    import retention
+    return {'archived': retention.archive_messages_before(hot_cutoff())}
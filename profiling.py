@@ -0,0 +1,212 @@
+"""Function timers on the hot paths and an on-demand sampling profiler.
+
+@timed(name) records a function's wall time in function_duration_seconds; SQLAlchemy
+flushes are recorded there as "session.flush" too. The Sampler walks every thread's stack
+from a real OS thread (not a greenlet, so it runs even when a gevent worker is busy) every
+PROFILING_INTERVAL_MS and counts the stacks it sees. Samples are wall-clock, so threads
+blocked in I/O show up where they wait. Profiles come out as collapsed stacks (for
+flamegraph.pl / speedscope) or speedscope JSON, and are taken either
+
+- from one worker by POST /admin/profile?seconds=N&format=speedscope|collapsed, with
+  "Authorization: Bearer $PROFILING_TOKEN" (the endpoint is off without a token), or
+- from every worker at once by sending them SIGUSR2 (pkill -USR2 -P <gunicorn master pid>);
+  each writes PROFILING_SIGNAL_SECONDS of samples to PROFILE_DIR.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import functools
+from collections import Counter
+from datetime import datetime
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import event
+from database import RoutingSession
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('speedscope', 'collapsed')
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+FUNCTION_LATENCY = metrics.registry.register(metrics.Histogram(
+    'function_duration_seconds', 'Wall time of instrumented hot-path functions', labels=('function',)))
+
+bp = Blueprint('profiling', __name__)
+
+
+def timed(name):
+    """Decorator recording each call's duration under name"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                FUNCTION_LATENCY.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _start_flush_timer(session, flush_context, instances):
+    session.info['flush_started'] = time.perf_counter()
+
+
+@event.listens_for(RoutingSession, 'after_flush_postexec')
+def _stop_flush_timer(session, flush_context):
+    started = session.info.pop('flush_started', None)
+    if started is not None:
+        FUNCTION_LATENCY.observe(time.perf_counter() - started, 'session.flush')
+
+
+def _original(module, name):
+    """module.name as it was before gevent/eventlet monkey-patching"""
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        return monkey.get_original(module, name)
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        return getattr(patcher.original(module), name)
+    return getattr(__import__(module), name)
+
+
+class Sampler:
+    """Counts the stacks of every other thread, sampled every interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.finished = None
+
+    def run(self, seconds):
+        """Sample for seconds on the calling (OS) thread"""
+        sleep = _original('time', 'sleep')
+        me = _original('_thread', 'get_ident')()
+        self.started = time.time()
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != me:
+                        self.stacks[self._stack(frame)] += 1
+                self.samples += 1
+                sleep(self.interval)
+        finally:
+            self.finished = time.time()
+        return self
+
+    @staticmethod
+    def _stack(frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        # Outermost caller first, as both output formats expect
+        return tuple(reversed(frames))
+
+    def collapsed(self):
+        """One "caller;...;callee count" line per distinct stack"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = ';'.join(f'{name} ({os.path.basename(filename)}:{line})' for name, filename, line in stack)
+            lines.append(f'{names} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self, name):
+        frames = []
+        index = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                sample.append(index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'profiling.py',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+        }
+
+    def render(self, format, name):
+        if format == 'collapsed':
+            return self.collapsed().encode(), 'text/plain'
+        return json.dumps(self.speedscope(name)).encode(), 'application/json'
+
+
+def _profile_name():
+    return f'pid {os.getpid()} at {datetime.now().isoformat(timespec="seconds")}'
+
+
+def _sample_in_thread(seconds, interval):
+    """Run a Sampler for seconds on a fresh OS thread and wait for it"""
+    sampler = Sampler(interval)
+    _original('_thread', 'start_new_thread')(sampler.run, (seconds,))
+    # Poll with the (possibly cooperative) sleep so a gevent worker keeps serving meanwhile
+    while sampler.finished is None:
+        time.sleep(min(0.1, seconds))
+    return sampler
+
+
+@bp.route('/admin/profile', methods=['POST'])
+def profile_endpoint():
+    token = current_app.config['PROFILING_TOKEN']
+    if not token:
+        abort(404)
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+
+    seconds = request.args.get('seconds', 10, type=float)
+    seconds = max(0.1, min(seconds, current_app.config['PROFILING_MAX_SECONDS']))
+    format = request.args.get('format', 'speedscope')
+    if format not in FORMATS:
+        return Response(f'format must be one of {", ".join(FORMATS)}\n', status=400, mimetype='text/plain')
+
+    sampler = _sample_in_thread(seconds, current_app.config['PROFILING_INTERVAL_MS'] / 1000)
+    body, mimetype = sampler.render(format, _profile_name())
+    return Response(body, mimetype=mimetype)
+
+
+def start_signal_profiler(app):
+    """Profile this process for PROFILING_SIGNAL_SECONDS on each SIGUSR2 (call once per worker)"""
+    config = app.config
+    folder = config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+
+    def profile_to_file():
+        sampler = Sampler(config['PROFILING_INTERVAL_MS'] / 1000).run(config['PROFILING_SIGNAL_SECONDS'])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'profile-{os.getpid()}-{int(sampler.started)}.speedscope.json')
+        with open(path, 'wb') as f:
+            f.write(sampler.render('speedscope', _profile_name())[0])
+        logger.info("Wrote %s samples to %s", sampler.samples, path)
+
+    def handle(signum, frame):
+        logger.info("Profiling for %ss on signal", config['PROFILING_SIGNAL_SECONDS'])
+        _original('_thread', 'start_new_thread')(profile_to_file, ())
+
+    signal.signal(signal.SIGUSR2, handle)
+
+
+def init_app(app):
+    app.register_blueprint(bp)
@@ -0,0 +1,84 @@
+import json
+from database import db
+from models import User, UserMedia, FriendRequest, Message, GroupMessage, Notification, group_membership
+
+# Sample ids; plan shape doesn't depend on whether the rows exist
+A, B = 1, 2
+
+
+def hot_queries():
+    """The query shapes the request paths depend on, as (name, statement) pairs"""
+    return [
+        ('chat_history', db.select(Message).where(db.or_(
+            db.and_(Message.sender_id == A, Message.recipient_id == B),
+            db.and_(Message.sender_id == B, Message.recipient_id == A)
+        )).order_by(Message.created_at)),
+        ('unread_messages', db.select(db.func.count(Message.id)).where(
+            Message.recipient_id == A, Message.is_read == db.false())),
+        ('pending_friend_requests', db.select(FriendRequest).where(
+            FriendRequest.receiver_id == A, FriendRequest.status == 'pending')),
+        ('existing_friend_request', db.select(FriendRequest).where(
+            FriendRequest.sender_id == A, FriendRequest.receiver_id == B)),
+        ('group_history', db.select(GroupMessage).where(
+            GroupMessage.group_id == A, GroupMessage.seq < B).order_by(GroupMessage.seq.desc()).limit(50)),
+        ('group_messages_after', db.select(GroupMessage).where(
+            GroupMessage.group_id == A, GroupMessage.seq > B).order_by(GroupMessage.seq).limit(50)),
+        ('messages_received_after', db.select(Message).where(
+            Message.recipient_id == A, Message.id > B).order_by(Message.id).limit(200)),
+        ('messages_sent_after', db.select(Message).where(
+            Message.sender_id == A, Message.id > B).order_by(Message.id).limit(200)),
+        ('group_messages_for_member_after', db.select(GroupMessage).where(
+            GroupMessage.group_id.in_(db.select(group_membership.c.group_id).where(group_membership.c.user_id == A)),
+            GroupMessage.id > B).order_by(GroupMessage.id).limit(200)),
+        ('group_members', db.select(group_membership.c.user_id).where(group_membership.c.group_id == A)),
+        ('notification_feed', db.select(Notification).where(Notification.user_id == A)
+            .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(20)),
+        ('unread_notifications', db.select(Notification).where(
+            Notification.user_id == A, Notification.is_read == db.false())),
+        ('nearby_users', db.select(User.id).where(
+            User.latitude.between(40.0, 41.0), User.longitude.between(-74.5, -73.5))),
+        ('suggestion_segment', db.select(User.id).where(
+            User.looking_for == 'friendship', User.availability.in_(('weekends', 'flexible')),
+            User.age_bucket.in_((2, 3, 4)), User.geo_cell.in_(('40:-75', '40:-74', '41:-74')))),
+        ('user_media_page', db.select(UserMedia).where(
+            UserMedia.user_id == A, UserMedia.kind == UserMedia.ACTIVITY_IMAGE).order_by(UserMedia.id.desc())),
+    ]
+
+
+def _sqlite_full_scans(connection, sql):
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    plan = [row[-1] for row in rows]
+    # "SCAN <table>" (with or without an index) walks the whole table; "SEARCH" seeks into an index
+    scans = [line for line in plan if line.startswith('SCAN ') and 'CONSTANT ROW' not in line]
+    return plan, scans
+
+
+def _postgres_full_scans(connection, sql):
+    # Tiny tables make sequential scans cheapest, so rule them out: a Seq Scan left in the
+    # plan means no index can serve the query at all.
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(f"Seq Scan on {node.get('Relation Name')}")
+        nodes.extend(node.get('Plans', []))
+    return plan, scans
+
+
+def check_hot_queries():
+    """EXPLAIN every hot query; returns (name, plan, full_scans) triples"""
+    results = []
+    with db.engine.connect() as connection:
+        explain = _postgres_full_scans if connection.dialect.name == 'postgresql' else _sqlite_full_scans
+        for name, statement in hot_queries():
+            sql = str(statement.compile(connection, compile_kwargs={'literal_binds': True}))
+            with connection.begin():
+                plan, scans = explain(connection, sql)
+            results.append((name, plan, scans))
+    return results
@@ -0,0 +1,180 @@
+"""Token-bucket limits for Socket.IO events and busy HTTP endpoints.
+
+Every limited action is checked against a bucket per connection and a bucket per user;
+each bucket holds up to `burst` tokens and refills at `rate` tokens a second. Limits are
+configured as "name=burst/rate" lists (RATE_LIMITS per connection, RATE_LIMITS_PER_USER
+per user), with `default` covering socket events that aren't named. Buckets live in this
+process unless RATE_LIMIT_STORAGE_URL points at a Redis server shared by all workers.
+"""
+import time
+import threading
+import functools
+from flask import current_app, jsonify, request
+from flask_login import current_user
+from flask_socketio import emit
+import metrics
+
+# Socket.IO lifecycle events aren't client-driven traffic and are never limited
+UNLIMITED_EVENTS = ('connect', 'disconnect')
+
+LIMITED = metrics.registry.register(metrics.Counter(
+    'rate_limited_total', 'Events and requests refused by a rate limit', labels=('name', 'scope')))
+
+
+def parse_limits(value):
+    """"a=20/5,default=60/10" -> {'a': (20.0, 5.0), 'default': (60.0, 10.0)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, spec = item.partition('=')
+        burst, _, rate = spec.partition('/')
+        limits[name.strip()] = (float(burst), float(rate or 1))
+    return limits
+
+
+class LocalBackend:
+    """Buckets in a dict; idle buckets that have refilled completely are pruned"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, burst, rate, cost=1):
+        """Take cost tokens if available; returns seconds until they would be, 0 if taken"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp, full_at = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            if tokens < cost:
+                self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+                return (cost - tokens) / rate
+            tokens -= cost
+            if len(self.buckets) >= self.max_keys and key not in self.buckets:
+                self._prune(now)
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return 0
+
+    def _prune(self, now):
+        for key, (tokens, stamp, full_at) in list(self.buckets.items()):
+            if full_at <= now:
+                del self.buckets[key]
+
+
+class RedisBackend:
+    """Buckets in Redis hashes, updated atomically by a script so all workers share them"""
+
+    SCRIPT = """
+    local burst, rate, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local tokens = tonumber(state[1]) or burst
+    local stamp = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - stamp) * rate)
+    local taken = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        taken = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+    return {taken, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL needs the redis package installed') from None
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, burst, rate, cost=1):
+        taken, tokens = self.script(keys=[self.prefix + key], args=[burst, rate, time.time(), cost])
+        if taken:
+            return 0
+        return (cost - float(tokens)) / rate
+
+
+def _limit_for(limits, name, use_default):
+    limit = limits.get(name)
+    if limit is None and use_default:
+        limit = limits.get('default')
+    return limit
+
+
+def take(state, name, user_id=None, connection_id=None, use_default=False):
+    """Charge one token for name against state (app.extensions['rate_limit']).
+
+    Returns (scope, retry_after) when refused, else None.
+    """
+    checks = []
+    connection_limit = _limit_for(state['connection'], name, use_default)
+    if connection_id is not None and connection_limit:
+        checks.append(('connection', f'{name}:sid:{connection_id}', connection_limit))
+    user_limit = _limit_for(state['user'], name, use_default)
+    if user_id is not None and user_limit:
+        checks.append(('user', f'{name}:user:{user_id}', user_limit))
+
+    for scope, key, (burst, rate) in checks:
+        retry_after = state['backend'].take(key, burst, rate)
+        if retry_after:
+            LIMITED.inc(name, scope)
+            return scope, retry_after
+    return None
+
+
+def check(name, connection_id=None, use_default=False):
+    """take() for the current app and logged-in user"""
+    user_id = current_user.id if current_user.is_authenticated else None
+    return take(current_app.extensions['rate_limit'], name, user_id, connection_id, use_default)
+
+
+def slow_down(name, scope, retry_after):
+    return {'error': 'slow_down', 'event': name, 'scope': scope, 'retry_after': round(retry_after, 3)}
+
+
+def limit_event(name):
+    """Decorator refusing a Socket.IO event over its limits with a 'slow_down' emit.
+
+    The same reply is returned so clients that asked for an acknowledgement get it too.
+    """
+    def decorator(handler):
+        if name in UNLIMITED_EVENTS:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            refused = check(name, connection_id=request.sid, use_default=True)
+            if refused:
+                reply = slow_down(name, *refused)
+                emit('slow_down', reply)
+                return reply
+            return handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def limit_route(name):
+    """Decorator answering 429 with a 'slow_down' body when a view is over its limit"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            refused = check(name)
+            if refused:
+                scope, retry_after = refused
+                response = jsonify(slow_down(name, scope, retry_after))
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, round(retry_after)))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    url = app.config['RATE_LIMIT_STORAGE_URL']
+    app.extensions['rate_limit'] = {
+        'backend': RedisBackend(url) if url else LocalBackend(),
+        'connection': parse_limits(app.config['RATE_LIMITS']),
+        'user': parse_limits(app.config['RATE_LIMITS_PER_USER']),
+    }
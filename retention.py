@@ -0,0 +1,130 @@
+import time
+import logging
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from database import db
+from models import (Notification, NotificationArchive, Message, MessageArchive,
+                    GroupMessage, GroupMessageArchive)
+
+logger = logging.getLogger(__name__)
+
+
+def _cutoff(days):
+    # Timestamp columns are stored naive in UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+
+def table_size(table_name):
+    """On-disk size of a table in bytes, or None when the backend can't report it"""
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'postgresql':
+            return db.session.execute(
+                db.text("SELECT pg_total_relation_size(CAST(:name AS regclass))"), {'name': table_name}
+            ).scalar()
+        if dialect == 'sqlite':
+            # Needs SQLite built with SQLITE_ENABLE_DBSTAT_VTAB
+            return db.session.execute(
+                db.text("SELECT SUM(pgsize) FROM dbstat WHERE name = :name"), {'name': table_name}
+            ).scalar()
+    except DBAPIError:
+        db.session.rollback()
+    return None
+
+
+def move_in_batches(model, condition, archive_model=None, batch_size=None, pause=None, on_batch=None):
+    """Delete (or archive, then delete) rows matching condition, one short transaction per batch.
+
+    Each batch selects at most batch_size primary keys, so locks are held only for that
+    batch; on_batch(ids) runs inside each batch's transaction. Returns a stats dict with rows
+    removed, rows/second and table size before/after. batch_size and pause default to
+    RETENTION_BATCH_SIZE and RETENTION_BATCH_PAUSE.
+    """
+    if batch_size is None:
+        batch_size = current_app.config['RETENTION_BATCH_SIZE']
+    if pause is None:
+        pause = current_app.config['RETENTION_BATCH_PAUSE']
+    table = model.__table__
+    size_before = table_size(table.name)
+    removed = 0
+    started = time.monotonic()
+
+    archive_columns = None
+    if archive_model is not None:
+        archive_columns = [column.name for column in archive_model.__table__.columns
+                           if column.name in table.c]
+
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(model.id)
+               .filter(condition).order_by(model.id).limit(batch_size)]
+        if not ids:
+            break
+
+        if archive_columns:
+            rows = db.select(*[table.c[name] for name in archive_columns]).where(table.c.id.in_(ids))
+            db.session.execute(db.insert(archive_model.__table__).from_select(archive_columns, rows))
+        db.session.execute(db.delete(table).where(table.c.id.in_(ids)))
+        if on_batch is not None:
+            on_batch(ids)
+        db.session.commit()
+
+        removed += len(ids)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    elapsed = time.monotonic() - started
+    stats = {
+        'table': table.name,
+        'archived': archive_model is not None,
+        'removed': removed,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(removed / elapsed, 1) if elapsed > 0 else 0.0,
+        'size_before': size_before,
+        'size_after': table_size(table.name)
+    }
+    logger.info("Retention %s: removed %s rows in %ss (%s rows/s), size %s -> %s", table.name, removed,
+                stats['seconds'], stats['rows_per_second'], size_before, stats['size_after'])
+    return stats
+
+
+def purge_read_notifications(ttl_days=None, archive=False, **kwargs):
+    """Remove read notifications older than ttl_days (default NOTIFICATION_TTL_DAYS)"""
+    if ttl_days is None:
+        ttl_days = current_app.config['NOTIFICATION_TTL_DAYS']
+    condition = db.and_(Notification.is_read.is_(True), Notification.created_at < _cutoff(ttl_days))
+    return move_in_batches(Notification, condition, NotificationArchive if archive else None, **kwargs)
+
+
+def archive_messages(older_than_days, **kwargs):
+    """Move read direct messages and all group messages older than the cutoff to archive tables"""
+    return archive_messages_before(_cutoff(older_than_days), **kwargs)
+
+
+def archive_messages_before(cutoff, **kwargs):
+    """archive_messages() for an explicit naive-UTC cutoff, e.g. a month boundary.
+
+    Archived messages are dropped from the search index along with their rows.
+    """
+    import message_search
+
+    return [
+        move_in_batches(Message, db.and_(Message.is_read.is_(True), Message.created_at < cutoff),
+                        MessageArchive, on_batch=lambda ids: message_search.remove(message_search.DIRECT, ids),
+                        **kwargs),
+        move_in_batches(GroupMessage, GroupMessage.created_at < cutoff, GroupMessageArchive,
+                        on_batch=lambda ids: message_search.remove(message_search.GROUP, ids), **kwargs),
+    ]
+
+
+def run_retention(notification_ttl_days=None, archive_notifications=False,
+                  message_archive_days=None, **kwargs):
+    """Run every configured retention step and return their stats"""
+    if message_archive_days is None:
+        message_archive_days = current_app.config['MESSAGE_ARCHIVE_DAYS']
+    results = [purge_read_notifications(notification_ttl_days, archive=archive_notifications, **kwargs)]
+    if message_archive_days:
+        results.extend(archive_messages(message_archive_days, **kwargs))
+    return results
@@ -0,0 +1,6 @@
+def register_blueprints(app):
+    """Import each subsystem's routes and socket handlers and attach them to the app"""
+    from routes import auth, main, profile, friends, chat, groups, location, notifications
+
+    for module in (auth, main, profile, friends, chat, groups, location, notifications):
+        app.register_blueprint(module.bp)
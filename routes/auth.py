@@ -0,0 +1,179 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, current_app
+from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime, timezone, timedelta
+import random
+import string
+import logging
+from database import db
+from extensions import login_manager, get_mail
+from models import User
+from forms import LoginForm, RegistrationForm, RequestPasswordResetForm, ResetPasswordForm
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('auth', __name__)
+
+@login_manager.user_loader
+def load_user(user_id):
+    logger.debug("Loading user with ID: %s", user_id)
+    return User.load_cached(int(user_id))
+
+def send_otp_email(user_email, otp):
+    try:
+        logger.info("Attempting to send OTP email to %s", user_email)
+        config = current_app.config
+        logger.debug("Mail config: SERVER=%s, PORT=%s, TLS=%s, USERNAME=%s", config['MAIL_SERVER'],
+                     config['MAIL_PORT'], config['MAIL_USE_TLS'], 'Set' if config['MAIL_USERNAME'] else 'Not Set')
+
+        from flask_mail import Message
+        msg = Message()
+        msg.subject = "Your Login OTP"
+        msg.sender = config['MAIL_DEFAULT_SENDER']
+        msg.recipients = [user_email]
+        msg.body = f'''Your OTP for login is: {otp}
+
+This code will expire in 10 minutes.
+If you did not request this code, please ignore this email.'''
+
+        get_mail().send(msg)
+        logger.info("OTP email sent successfully to %s", user_email)
+        return True
+    except Exception as e:
+        logger.error("Failed to send OTP email: %r", e)
+        return False
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    logger.debug("Accessing login route")
+    if current_user.is_authenticated:
+        return redirect(url_for('profile.profile'))
+
+    form = LoginForm()
+    if form.validate_on_submit():
+        logger.debug("Attempting login for email: %s", form.email.data)
+        user = User.query.filter_by(email=form.email.data).first()
+        if user:
+            logger.debug("User found, checking password")
+            password_matches = check_password_hash(user.password_hash, form.password.data)
+            if password_matches:
+                # Generate and store OTP
+                otp = ''.join(random.choices(string.digits, k=6))
+                user.otp_code = otp
+                user.otp_expiry = datetime.now(timezone.utc) + timedelta(minutes=10)
+
+                # Send OTP via email
+                if send_otp_email(user.email, otp):
+                    db.session.commit()
+                    return jsonify({"success": True, "message": "OTP sent successfully"})
+                else:
+                    return jsonify({"success": False, "message": "Failed to send OTP. Please try again."})
+            else:
+                logger.debug("Password verification failed")
+        else:
+            logger.debug("User not found")
+        return jsonify({"success": False, "message": "Invalid email or password"})
+
+    return render_template('login.html', form=form)
+
+@bp.route('/verify-otp', methods=['POST'])
+def verify_otp():
+    logger.debug("Verifying OTP")
+    email = request.form.get('email')
+    otp = request.form.get('otp')
+
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        return jsonify({"success": False, "message": "User not found"})
+
+    if not user.otp_code or not user.otp_expiry:
+        return jsonify({"success": False, "message": "No OTP request found"})
+
+    # Convert otp_expiry to UTC if it's naive
+    user_otp_expiry = user.otp_expiry
+    if user_otp_expiry.tzinfo is None:
+        user_otp_expiry = user_otp_expiry.replace(tzinfo=timezone.utc)
+
+    if datetime.now(timezone.utc) > user_otp_expiry:
+        return jsonify({"success": False, "message": "OTP has expired"})
+
+    if user.otp_code != otp:
+        return jsonify({"success": False, "message": "Invalid OTP"})
+
+    login_user(user)
+    user.otp_code = None
+    user.otp_expiry = None
+    db.session.commit()
+
+    return jsonify({"success": True, "redirect": url_for('main.home')})
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('auth.login'))
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    logger.debug("Accessing register route")
+    if current_user.is_authenticated:
+        return redirect(url_for('profile.profile'))
+
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        user = User(
+            username=form.username.data,
+            email=form.email.data
+        )
+        user.password_hash = generate_password_hash(form.password.data)
+
+        try:
+            db.session.add(user)
+            db.session.commit()
+            flash('Registration successful! Please log in.', 'success')
+            return redirect(url_for('auth.login'))
+        except Exception as e:
+            logger.error("Registration error: %s", e)
+            db.session.rollback()
+            flash('An error occurred during registration.', 'danger')
+
+    return render_template('register.html', form=form)
+
+@bp.route('/reset_password_request', methods=['GET', 'POST'])
+def reset_password_request():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    form = RequestPasswordResetForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if user:
+            # Generate reset token
+            token = ''.join(random.choices(string.ascii_letters + string.digits, k=32))
+            user.reset_token = token
+            user.reset_token_expiry = datetime.now(timezone.utc) + timedelta(hours=24)
+            db.session.commit()
+            # TODO: Send password reset email
+            flash('Check your email for instructions to reset your password', 'info')
+            return redirect(url_for('auth.login'))
+        flash('If an account exists with that email, password reset instructions will be sent.', 'info')
+        return redirect(url_for('auth.login'))
+    return render_template('reset_password_request.html', form=form)
+
+@bp.route('/reset_password/<token>', methods=['GET', 'POST'])
+def reset_password(token):
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    user = User.query.filter_by(reset_token=token).first()
+    if not user or not user.reset_token_expiry or datetime.now(timezone.utc) > user.reset_token_expiry:
+        flash('Invalid or expired reset token', 'error')
+        return redirect(url_for('auth.login'))
+    form = ResetPasswordForm()
+    if form.validate_on_submit():
+        user.password_hash = generate_password_hash(form.password.data)
+        user.reset_token = None
+        user.reset_token_expiry = None
+        db.session.commit()
+        flash('Your password has been reset.', 'success')
+        return redirect(url_for('auth.login'))
+    return render_template('reset_password.html', form=form)
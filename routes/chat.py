@@ -0,0 +1,235 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, current_app
+from flask_login import login_required, current_user
+from flask_socketio import emit, join_room, leave_room
+from werkzeug.utils import secure_filename
+from datetime import datetime, timezone
+import os
+from database import db, read_replica
+from extensions import socket_event
+from models import User, Message as DbMessage, MessageArchive
+import notifications
+import partitions
+import delivery
+import message_search
+import rate_limit
+import metrics
+import profiling
+
+bp = Blueprint('chat', __name__)
+
+@bp.route('/chat/<int:user_id>')
+@login_required
+def chat(user_id):
+    other_user = User.query.get_or_404(user_id)
+
+    def conversation(model):
+        return ((model.sender_id == current_user.id) & (model.recipient_id == user_id)) | \
+               ((model.sender_id == user_id) & (model.recipient_id == current_user.id))
+
+    # Only the hot months unless the user asks for older history, which also reads the archive
+    full_history = request.args.get('history') == 'all'
+    query = DbMessage.query.filter(conversation(DbMessage))
+    if full_history:
+        messages = query.all() + MessageArchive.query.filter(conversation(MessageArchive)).all()
+        messages.sort(key=lambda message: message.created_at)
+        has_older = False
+    else:
+        messages = query.filter(partitions.hot(DbMessage.created_at)).order_by(DbMessage.created_at.asc()).all()
+        has_older = db.session.query(
+            query.filter(~partitions.hot(DbMessage.created_at)).exists()
+            | MessageArchive.query.filter(conversation(MessageArchive)).exists()
+        ).scalar()
+
+    # Mark messages as read
+    unread_messages = DbMessage.query.filter_by(
+        recipient_id=current_user.id,
+        sender_id=user_id,
+        is_read=False
+    ).all()
+
+    for message in unread_messages:
+        message.is_read = True
+    notifications.mark_read(current_user, type='message', sender_id=user_id)
+    db.session.commit()
+
+    return render_template('chat.html', other_user=other_user, messages=messages, has_older=has_older)
+
+@bp.route('/messages')
+@login_required
+@read_replica
+def messages():
+    # Get list of users current user has chatted with using subqueries; recent months only
+    # unless all conversations were asked for, so old partitions aren't scanned
+    show_all = request.args.get('all') == '1'
+    sent_messages = DbMessage.query.filter_by(sender_id=current_user.id).with_entities(DbMessage.recipient_id).distinct()
+    received_messages = DbMessage.query.filter_by(recipient_id=current_user.id).with_entities(DbMessage.sender_id).distinct()
+    if not show_all:
+        sent_messages = sent_messages.filter(partitions.hot(DbMessage.created_at))
+        received_messages = received_messages.filter(partitions.hot(DbMessage.created_at))
+
+    # Combine both subqueries to get all unique user IDs
+    user_ids = [id[0] for id in sent_messages.union(received_messages).all()]
+
+    # Get user objects for these IDs and all friends, loading only the columns the list shows
+    summary = User.load_columns(User.SUMMARY_COLUMNS)
+    chat_partners = User.query.options(summary).filter(User.id.in_(user_ids)).all()
+    friends = current_user.friends.options(summary).all()
+
+    # Unread messages from each partner to the current user, in one grouped query
+    unread_counts = dict(
+        DbMessage.query.with_entities(DbMessage.sender_id, db.func.count())
+        .filter_by(recipient_id=current_user.id, is_read=False)
+        .group_by(DbMessage.sender_id)
+    )
+
+    return render_template('messages.html', chat_partners=chat_partners, friends=friends,
+                           unread_counts=unread_counts, show_all=show_all)
+
+@bp.route('/api/messages/search')
+@login_required
+@read_replica
+@rate_limit.limit_route('message_search')
+def search_messages():
+    limit = min(max(request.args.get('limit', message_search.SEARCH_PAGE, type=int), 1), 50)
+    hits, next_before, timed_out = message_search.search(
+        current_user.id,
+        request.args.get('q', ''),
+        before_id=request.args.get('before', type=int),
+        limit=limit
+    )
+    return jsonify({'results': hits, 'next_before': next_before, 'timed_out': timed_out})
+
+@bp.route('/test-message/<int:recipient_id>')
+@login_required
+def test_message(recipient_id):
+    # Create a test message
+    message = DbMessage(
+        sender_id=current_user.id,
+        recipient_id=recipient_id,
+        content="Test message"
+    )
+    db.session.add(message)
+    db.session.commit()
+
+    flash('Test message sent successfully!', 'success')
+    return redirect(url_for('chat.messages'))
+
+@bp.route('/upload-chat-media', methods=['POST'])
+@login_required
+@profiling.timed('upload_chat_media')
+def upload_chat_media():
+    try:
+        if 'media' not in request.files:
+            return jsonify({'success': False, 'message': 'No file provided'})
+
+        file = request.files['media']
+        if file.filename == '':
+            return jsonify({'success': False, 'message': 'No file selected'})
+
+        # Define allowed extensions for different media types
+        ALLOWED_EXTENSIONS = {
+            'image': {'png', 'jpg', 'jpeg', 'gif'},
+            'video': {'mp4', 'webm'},
+            'audio': {'mp3', 'wav', 'ogg'},
+            'document': {'pdf', 'doc', 'docx', 'txt'}
+        }
+
+        file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+        media_type = None
+        for type_name, extensions in ALLOWED_EXTENSIONS.items():
+            if file_ext in extensions:
+                media_type = type_name
+                break
+
+        if not media_type:
+            return jsonify({'success': False, 'message': 'File type not allowed'})
+
+        # Generate unique filename
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"chat_media_{current_user.id}_{timestamp}_{secure_filename(file.filename)}"
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+
+        # Process different media types
+        if media_type == 'image':
+            from PIL import Image
+            image = Image.open(file)
+            # Resize image maintaining aspect ratio
+            image.thumbnail((800, 800), Image.Resampling.LANCZOS)
+            image.save(filepath, quality=85, optimize=True)
+        else:
+            # For other media types, save directly with size limit
+            file.save(filepath)
+
+        media_url = url_for('static', filename=f'uploads/{filename}')
+        return jsonify({
+            'success': True,
+            'media_url': media_url,
+            'media_type': media_type
+        })
+
+    except Exception as e:
+        current_app.logger.error("Media upload error: %s", e)
+        return jsonify({'success': False, 'message': 'Error uploading media'})
+
+@socket_event('connect')
+def handle_connect(auth=None):
+    metrics.SOCKET_CONNECTIONS.inc('connect')
+    if current_user.is_authenticated:
+        join_room(f'user_{current_user.id}')
+        current_user.last_active = datetime.now(timezone.utc)
+        db.session.commit()
+
+        # Re-send whatever the client missed since the cursor it last saw
+        cursor = auth.get('cursor') if isinstance(auth, dict) else None
+        events, cursor, resync = delivery.replay(current_user.id, cursor)
+        for event, payload in events:
+            emit(event, payload)
+            metrics.count_emit(event)
+        if cursor is not None:
+            emit('delivery_cursor', {'cursor': cursor, 'resync': resync})
+
+@socket_event('disconnect')
+def handle_disconnect(reason=None):
+    metrics.SOCKET_CONNECTIONS.inc('disconnect')
+    if current_user.is_authenticated:
+        leave_room(f'user_{current_user.id}')
+
+@socket_event('send_message')
+@profiling.timed('handle_message')
+def handle_message(data):
+    if not current_user.is_authenticated:
+        return
+
+    recipient_id = data.get('recipient_id')
+    content = data.get('content')
+    media_url = data.get('media_url')
+    media_type = data.get('media_type')
+
+    message = DbMessage(
+        sender_id=current_user.id,
+        recipient_id=recipient_id,
+        content=content,
+        media_url=media_url,
+        media_type=media_type
+    )
+    db.session.add(message)
+    db.session.flush()  # Assign message.id for the notification
+    message_search.index(message_search.DIRECT, message)
+
+    # Create notification for recipient
+    notifications.notify(
+        [recipient_id],
+        type='message',
+        content=f'New message from {current_user.username}',
+        sender_id=current_user.id,
+        related_id=message.id
+    )
+    db.session.commit()
+
+    # Emit the message to both sender and recipient
+    message_data = message.to_dict(sender_username=current_user.username)
+
+    emit('new_message', message_data, room=f'user_{recipient_id}')
+    emit('new_message', message_data, room=f'user_{current_user.id}')
+    metrics.count_emit('new_message', 2)
+    delivery.record(delivery.MESSAGE, message.id, (message.sender_id, message.recipient_id), message_data)
@@ -0,0 +1,179 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timezone
+import logging
+from database import db, read_replica
+from models import User, UserMatch, FriendRequest
+import friendships
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('friends', __name__)
+
+# Most ids one bulk call may touch
+MAX_BULK_REQUESTS = 500
+
+@bp.route('/friend-suggestions')
+@login_required
+@read_replica
+def friend_suggestions():
+    logger.debug("Getting friend suggestions for user %s", current_user.id)
+
+    # Get filter parameters from request
+    filters = {
+        'search': request.args.get('search', ''),
+        'min_age': request.args.get('min_age', type=int),
+        'max_age': request.args.get('max_age', type=int),
+        'activity': request.args.get('activity', ''),
+        'interest': request.args.get('interest', ''),
+        'max_distance': request.args.get('max_distance', type=float)
+    }
+
+    # Remove empty filters
+    filters = {k: v for k, v in filters.items() if v}
+
+    # Update last active timestamp first; committing later would expire every loaded card.
+    # A last_active-only write doesn't make the reads below sticky to the primary.
+    current_user.last_active = datetime.now(timezone.utc)
+    db.session.commit()
+
+    # Get friend suggestions with filters, plus everyone's friendship status in two queries
+    suggestions = current_user.get_friend_suggestions(limit=10, filters=filters)
+    statuses = friendships.statuses(current_user, [user.id for user, score in suggestions])
+
+    return render_template('friend_suggestions.html', 
+                         suggestions=suggestions,
+                         statuses=statuses,
+                         current_filters=filters)
+
+@bp.route('/match-response/<int:match_id>/<string:response>')
+@login_required
+def match_response(match_id, response):
+    match = UserMatch.query.get_or_404(match_id)
+
+    # Verify the current user is the receiver of this match
+    if match.matched_user_id != current_user.id:
+        flash('Unauthorized action', 'danger')
+        return redirect(url_for('friends.friend_suggestions'))
+
+    if response not in ['accept', 'reject']:
+        flash('Invalid response', 'danger')
+        return redirect(url_for('friends.friend_suggestions'))
+
+    match.status = 'accepted' if response == 'accept' else 'rejected'
+    match.updated_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+    flash(f'Successfully {response}ed the friend suggestion', 'success')
+    return redirect(url_for('friends.friend_suggestions'))
+
+@bp.route('/send-friend-request/<int:user_id>', methods=['POST'])
+@login_required
+def send_friend_request(user_id):
+    if user_id == current_user.id:
+        flash('You cannot send a friend request to yourself.', 'error')
+        return redirect(url_for('friends.friend_suggestions'))
+
+    # Check if request already exists
+    existing_request = FriendRequest.query.filter_by(
+        sender_id=current_user.id,
+        receiver_id=user_id
+    ).first()
+
+    if existing_request:
+        flash('Friend request already sent.', 'info')
+        return redirect(url_for('friends.friend_suggestions'))
+
+    # Create new friend request; the unique pair index catches a concurrent duplicate
+    friend_request = FriendRequest(sender_id=current_user.id, receiver_id=user_id)
+    db.session.add(friend_request)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('Friend request already sent.', 'info')
+        return redirect(url_for('friends.friend_suggestions'))
+
+    flash('Friend request sent successfully!', 'success')
+    return redirect(url_for('friends.friend_suggestions'))
+
+@bp.route('/friend-requests')
+@login_required
+def friend_requests():
+    received_requests = FriendRequest.query.options(
+        db.joinedload(FriendRequest.sender).options(User.load_columns(User.CARD_COLUMNS))
+    ).filter_by(
+        receiver_id=current_user.id,
+        status='pending'
+    ).all()
+    return render_template('friend_requests.html', requests=received_requests)
+
+@bp.route('/handle-friend-request/<int:request_id>/<string:action>')
+@login_required
+def handle_friend_request(request_id, action):
+    friend_request = FriendRequest.query.get_or_404(request_id)
+
+    if friend_request.receiver_id != current_user.id:
+        flash('Unauthorized action', 'danger')
+        return redirect(url_for('friends.friend_requests'))
+
+    if action == 'accept':
+        # Add to both users' friends lists
+        current_user.add_friend(friend_request.sender)
+        friend_request.status = 'accepted'
+        flash('Friend request accepted!', 'success')
+    elif action == 'decline':
+        friend_request.status = 'declined'
+        flash('Friend request declined.', 'info')
+    else:
+        flash('Invalid action', 'danger')
+        return redirect(url_for('friends.friend_requests'))
+
+    db.session.commit()
+    return redirect(url_for('friends.friend_requests'))
+
+def _bulk_ids(data, key):
+    ids = data.get(key)
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_BULK_REQUESTS:
+        return None
+    try:
+        return {int(value) for value in ids}
+    except (TypeError, ValueError):
+        return None
+
+@bp.route('/api/friend-requests/bulk-send', methods=['POST'])
+@login_required
+def bulk_send_friend_requests():
+    user_ids = _bulk_ids(request.get_json(silent=True) or {}, 'user_ids')
+    if user_ids is None:
+        return jsonify({'success': False, 'message': f'Provide 1-{MAX_BULK_REQUESTS} user_ids'}), 400
+
+    try:
+        sent = friendships.send_requests(current_user.id, user_ids)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request for one of the pairs won the unique index; nothing was written
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Conflicting requests, please retry'}), 409
+    return jsonify({'success': True, 'sent': sent, 'skipped': len(user_ids) - sent})
+
+@bp.route('/api/friend-requests/bulk-respond', methods=['POST'])
+@login_required
+def bulk_respond_friend_requests():
+    data = request.get_json(silent=True) or {}
+    request_ids = _bulk_ids(data, 'request_ids')
+    action = data.get('action')
+    if request_ids is None or action not in ('accept', 'decline'):
+        return jsonify({'success': False, 'message': f"Provide 1-{MAX_BULK_REQUESTS} request_ids and "
+                                                     f"an action of 'accept' or 'decline'"}), 400
+
+    handled = friendships.respond_to_requests(current_user.id, request_ids, accept=action == 'accept')
+    db.session.commit()
+    return jsonify({'success': True, 'handled': len(handled), 'skipped': len(request_ids) - len(handled)})
+
+@bp.route('/my-friends')
+@login_required
+def my_friends():
+    friends = current_user.friends.options(User.load_columns(User.CARD_COLUMNS)).all()
+    return render_template('friends.html', friends=friends)
@@ -0,0 +1,152 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, abort, current_app
+from flask_login import login_required, current_user
+from flask_socketio import emit, join_room
+from datetime import datetime, timezone
+from database import db
+from extensions import socket_event
+from models import User, ChatGroup, GroupMessage
+import notifications
+import group_messages
+import message_search
+import delivery
+import metrics
+import profiling
+
+bp = Blueprint('groups', __name__)
+
+@bp.route('/groups')
+@login_required
+def groups():
+    return render_template('group_chat.html', active_group=None)
+
+@bp.route('/group/<int:group_id>')
+@login_required
+def group_chat(group_id):
+    group = ChatGroup.query.get_or_404(group_id)
+    if not group_messages.is_member(group_id, current_user.id):
+        abort(403)
+    # Latest window only; older history is fetched by seq from group_messages_api
+    messages = group_messages.window(group_id)
+    if notifications.mark_read(current_user, type='group_message', group_id=group_id):
+        db.session.commit()
+    return render_template('group_chat.html', active_group=group, messages=messages,
+                           history_page=group_messages.HISTORY_PAGE)
+
+@bp.route('/api/groups/<int:group_id>/messages')
+@login_required
+def group_messages_api(group_id):
+    if not group_messages.is_member(group_id, current_user.id):
+        return jsonify({'error': 'Not a member of this group'}), 403
+
+    limit = request.args.get('limit', group_messages.HISTORY_PAGE, type=int)
+    messages = group_messages.window(
+        group_id,
+        before_seq=request.args.get('before_seq', type=int),
+        after_seq=request.args.get('after_seq', type=int),
+        limit=limit
+    )
+    response = jsonify({
+        'messages': [group_messages.to_dict(message) for message in messages],
+        'first_seq': messages[0].seq if messages else None,
+        'last_seq': messages[-1].seq if messages else None,
+    })
+    # Lets polling clients revalidate with If-Modified-Since as well as the ETag
+    if messages:
+        response.last_modified = max(message.created_at for message in messages)
+    return response
+
+@bp.route('/create-group', methods=['POST'])
+@login_required
+def create_group():
+    name = request.form.get('name')
+    member_ids = request.form.getlist('members[]')
+
+    if not name:
+        flash('Group name is required', 'error')
+        return redirect(url_for('groups.groups'))
+
+    try:
+        # Create new group
+        group = ChatGroup(name=name, created_by=current_user.id)
+        db.session.add(group)
+
+        # Add creator as member
+        group.members.append(current_user)
+
+        # Add selected members, fetched in one query
+        ids = {int(member_id) for member_id in member_ids} - {current_user.id}
+        if ids:
+            for member in User.query.options(User.load_columns(('id',))).filter(User.id.in_(ids)):
+                group.members.append(member)
+
+        db.session.flush()
+        # Nothing should be cached for a new id, but a probe for it may have been
+        group_messages.member_ids.invalidate(group.id)
+        db.session.commit()
+        flash('Group created successfully!', 'success')
+        return redirect(url_for('groups.group_chat', group_id=group.id))
+    except Exception as e:
+        current_app.logger.error("Group creation error: %s", e)
+        flash('Error creating group', 'error')
+        db.session.rollback()
+        return redirect(url_for('groups.groups'))
+
+@socket_event('join_group')
+def handle_join_group(data):
+    if not current_user.is_authenticated:
+        return
+
+    group_id = data.get('group_id')
+    if group_id and group_messages.is_member(group_id, current_user.id):
+        join_room(f'group_{group_id}')
+        current_user.last_active = datetime.now(timezone.utc)
+        db.session.commit()
+
+@socket_event('group_message')
+@profiling.timed('handle_group_message')
+def handle_group_message(data):
+    if not current_user.is_authenticated:
+        return
+
+    group_id = data.get('group_id')
+    content = data.get('content')
+    media_url = data.get('media_url')
+    media_type = data.get('media_type')
+
+    group = ChatGroup.query.get(group_id)
+    if not group:
+        return
+    member_ids = group_messages.member_ids(group_id)
+    if current_user.id not in member_ids:
+        return
+
+    message = GroupMessage(
+        group_id=group_id,
+        seq=group_messages.next_seq(group_id),
+        sender_id=current_user.id,
+        content=content,
+        media_url=media_url,
+        media_type=media_type
+    )
+    db.session.add(message)
+    db.session.flush()  # Assign message.id for the notifications
+    message_search.index(message_search.GROUP, message)
+
+    # Create notifications for group members
+    notifications.notify(
+        [member_id for member_id in member_ids if member_id != current_user.id],
+        type='group_message',
+        content=f'New message in {group.name} from {current_user.username}',
+        sender_id=current_user.id,
+        group_id=group.id,
+        related_id=message.id
+    )
+
+    db.session.commit()
+
+    # Emit the message to all group members
+    message_data = group_messages.to_dict(message, sender_username=current_user.username)
+
+    emit('group_message', message_data, room=f'group_{group_id}')
+    metrics.count_emit('group_message')
+    delivery.record(delivery.GROUP_MESSAGE, message.id, member_ids, message_data)
@@ -0,0 +1,62 @@
+from flask import Blueprint, render_template, request, jsonify, current_app
+from flask_login import login_required, current_user
+from datetime import datetime, timezone
+from database import db, read_replica
+from extensions import socketio
+from models import User
+import friendships
+import metrics
+import rate_limit
+import serializers
+
+bp = Blueprint('location', __name__)
+
+@bp.route('/map')
+@login_required
+@read_replica
+def friend_map():
+    return render_template('map.html')
+
+@bp.route('/api/friend-locations')
+@login_required
+@read_replica
+def friend_locations():
+    # Friend ids come from the cache; their rows are read fresh since locations move
+    friends = User.query.options(User.load_columns(User.SUMMARY_COLUMNS)).filter(
+        User.id.in_(friendships.friend_ids(current_user.id))).all()
+    friend_data = []
+
+    for friend in friends:
+        view = serializers.project(friend, serializers.FRIEND, serializers.MAP_FIELDS)
+        # Friends who hide their location don't appear on the map
+        if view.get('latitude') and view.get('longitude'):
+            friend_data.append(view)
+
+    return serializers.json_response(friend_data)
+
+@bp.route('/api/update-location', methods=['POST'])
+@login_required
+@rate_limit.limit_route('update_location')
+def update_location():
+    data = request.get_json()
+
+    try:
+        current_user.latitude = float(data.get('latitude'))
+        current_user.longitude = float(data.get('longitude'))
+        current_user.last_active = datetime.now(timezone.utc)
+        current_user.update_segment()
+        db.session.commit()
+
+        # Notify friends about location update
+        friend_ids = friendships.friend_ids(current_user.id)
+        location_data = serializers.project(current_user, serializers.FRIEND, serializers.MAP_FIELDS)
+
+        if 'latitude' in location_data.fields:
+            for friend_id in friend_ids:
+                socketio.emit('friend_location_update', location_data, room=f'user_{friend_id}')
+            metrics.count_emit('friend_location_update', len(friend_ids))
+
+        return jsonify({'success': True})
+    except Exception as e:
+        current_app.logger.error("Location update error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 400
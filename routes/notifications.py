@@ -0,0 +1,51 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from database import db
+import notifications
+
+bp = Blueprint('notifications', __name__)
+
+@bp.route('/api/notifications')
+@login_required
+def notification_feed():
+    feed = notifications.get_feed(
+        current_user,
+        limit=request.args.get('limit', 20, type=int),
+        cursor=request.args.get('cursor'),
+        unread_only=request.args.get('unread') == '1'
+    )
+    return jsonify(feed)
+
+@bp.route('/api/notifications/unread-count')
+@login_required
+def notification_unread_count():
+    return jsonify({'unread': current_user.unread_notifications})
+
+def _is_id(value):
+    # bool is an int subclass, but true/false are never ids
+    return isinstance(value, int) and not isinstance(value, bool)
+
+@bp.route('/api/notifications/mark-read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object'}), 400
+    ids = data.get('ids')
+    if ids is not None and not (isinstance(ids, list) and all(_is_id(value) for value in ids)):
+        return jsonify({'success': False, 'message': 'ids must be a list of integers'}), 400
+    if data.get('type') is not None and not isinstance(data['type'], str):
+        return jsonify({'success': False, 'message': 'type must be a string'}), 400
+    for key in ('sender_id', 'group_id'):
+        if data.get(key) is not None and not _is_id(data[key]):
+            return jsonify({'success': False, 'message': f'{key} must be an integer'}), 400
+
+    changed = notifications.mark_read(
+        current_user,
+        ids=ids,
+        type=data.get('type'),
+        sender_id=data.get('sender_id'),
+        group_id=data.get('group_id')
+    )
+    db.session.commit()
+    return jsonify({'success': True, 'marked': changed, 'unread': current_user.unread_notifications})
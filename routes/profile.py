@@ -0,0 +1,176 @@
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, current_app, abort
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+from datetime import datetime
+import os
+import io
+from database import db
+from models import User, UserMedia
+from forms import ProfileForm
+import profiling
+import serializers
+
+bp = Blueprint('profile', __name__)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+ACTIVITY_IMAGES_PER_PAGE = 12
+
+@bp.route('/profile', methods=['GET', 'POST'])
+@login_required
+@profiling.timed('profile')  # includes the profile picture upload and resize
+def profile():
+    form = ProfileForm()
+    if form.validate_on_submit():
+        try:
+            # Handle profile picture upload
+            if 'profile_picture' in request.files:
+                file = request.files['profile_picture']
+                if file and file.filename:
+                    # Process image
+                    from PIL import Image
+                    image = Image.open(file)
+                    # Resize image to 512x512
+                    image = image.resize((512, 512))
+                    # Convert to RGB if necessary
+                    if image.mode != 'RGB':
+                        image = image.convert('RGB')
+                    # Save to bytes
+                    img_byte_arr = io.BytesIO()
+                    image.save(img_byte_arr, format='JPEG')
+                    img_byte_arr = img_byte_arr.getvalue()
+
+                    # Generate unique filename
+                    filename = secure_filename(file.filename)
+                    filepath = os.path.join('static', 'uploads', filename)
+
+                    # Save processed image
+                    with open(filepath, 'wb') as f:
+                        f.write(img_byte_arr)
+
+                    current_user.profile_picture = url_for('static', filename=f'uploads/{filename}')
+
+            # Update user profile information
+            current_user.bio = form.bio.data
+            current_user.interests = form.interests.data
+            current_user.location = form.location.data
+            current_user.age = form.age.data
+            current_user.looking_for = form.looking_for.data
+            current_user.activities = form.activities.data
+            current_user.availability = form.availability.data
+
+            # Update privacy settings
+            current_user.set_privacy_settings({
+                'location_visible': form.location_visible.data,
+                'interests_visible': form.interests_visible.data,
+                'bio_visible': form.bio_visible.data,
+                'age_visible': form.age_visible.data,
+                'activities_visible': form.activities_visible.data,
+                'availability_visible': form.availability_visible.data
+            })
+
+            current_user.touch_profile()
+            db.session.commit()
+            flash('Profile updated successfully!', 'success')
+            return redirect(url_for('profile.profile'))
+
+        except Exception as e:
+            current_app.logger.error("Profile update error: %s", e)
+            flash('An error occurred while updating your profile.', 'danger')
+            db.session.rollback()
+
+    # Pre-populate form with current user data
+    elif request.method == 'GET':
+        form.bio.data = current_user.bio
+        form.interests.data = current_user.interests
+        form.location.data = current_user.location
+        form.age.data = current_user.age
+        form.looking_for.data = current_user.looking_for
+        form.activities.data = current_user.activities
+        form.availability.data = current_user.availability
+
+        # Set privacy settings
+        if current_user.privacy_settings:
+            form.location_visible.data = current_user.privacy_settings.get('location_visible', True)
+            form.interests_visible.data = current_user.privacy_settings.get('interests_visible', True)
+            form.bio_visible.data = current_user.privacy_settings.get('bio_visible', True)
+            form.age_visible.data = current_user.privacy_settings.get('age_visible', True)
+            form.activities_visible.data = current_user.privacy_settings.get('activities_visible', True)
+            form.availability_visible.data = current_user.privacy_settings.get('availability_visible', True)
+
+    activity_images = current_user.get_media(UserMedia.ACTIVITY_IMAGE, limit=ACTIVITY_IMAGES_PER_PAGE)
+    return render_template('profile.html', form=form, activity_images=activity_images,
+                           activity_images_per_page=ACTIVITY_IMAGES_PER_PAGE)
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@bp.route('/upload-activity-image', methods=['POST'])
+@login_required
+@profiling.timed('upload_activity_image')
+def upload_activity_image():
+    try:
+        if 'activity_image' not in request.files:
+            return jsonify({'success': False, 'message': 'No file provided'})
+
+        file = request.files['activity_image']
+        if file.filename == '':
+            return jsonify({'success': False, 'message': 'No file selected'})
+
+        if file and allowed_file(file.filename):
+            # Process image
+            from PIL import Image
+            image = Image.open(file)
+
+            # Resize image maintaining aspect ratio
+            max_size = (800, 800)
+            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+            # Convert to RGB if necessary
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            # Generate unique filename
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f"activity_{current_user.id}_{timestamp}_{secure_filename(file.filename)}"
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+
+            # Save processed image
+            image.save(filepath, format='JPEG', quality=85)
+
+            # Record the activity image as its own row
+            image_url = url_for('static', filename=f'uploads/{filename}')
+            current_user.add_media(UserMedia.ACTIVITY_IMAGE, image_url)
+            current_user.touch_profile()
+            db.session.commit()
+
+            return jsonify({
+                'success': True,
+                'message': 'Image uploaded successfully',
+                'image_url': image_url
+            })
+
+    except Exception as e:
+        current_app.logger.error("Image upload error: %s", e)
+        return jsonify({'success': False, 'message': 'Error uploading image'})
+
+    return jsonify({'success': False, 'message': 'Invalid file type'})
+
+@bp.route('/api/activity-images')
+@bp.route('/api/activity-images/<int:user_id>')
+@login_required
+def activity_images(user_id=None):
+    user = current_user
+    if user_id and user_id != current_user.id:
+        user = User.query.get_or_404(user_id)
+        # Another user's images follow their activities privacy setting, as the field does
+        audience = serializers.FRIEND if current_user.is_friend_with(user) else serializers.PUBLIC
+        if 'activities' not in serializers.fields_for(audience, user.privacy_mask, ('activities',)):
+            abort(404)
+    before_id = request.args.get('before_id', type=int)
+    limit = min(max(request.args.get('limit', ACTIVITY_IMAGES_PER_PAGE, type=int), 1), 100)
+
+    images = user.get_media(UserMedia.ACTIVITY_IMAGE, limit=limit, before_id=before_id)
+    return jsonify({
+        'images': [image.to_dict() for image in images],
+        'next_before_id': images[-1].id if len(images) == limit else None
+    })
@@ -0,0 +1,158 @@
+"""Privacy-aware user payloads shared by templates, JSON APIs and Socket.IO events.
+
+A user's privacy_settings are compiled into User.privacy_mask when the profile is saved.
+project(user, audience) then copies only the fields that audience may see into a compact
+UserView, using a field list computed once per (audience, mask) pair.
+"""
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback when orjson isn't installed
+    orjson = None
+    import json
+
+PUBLIC = 'public'
+FRIEND = 'friend'
+SELF = 'self'
+
+# One bit per privacy_settings key; a set bit means visible
+LOCATION = 1
+INTERESTS = 2
+BIO = 4
+AGE = 8
+ACTIVITIES = 16
+AVAILABILITY = 32
+
+PRIVACY_BITS = {
+    'location_visible': LOCATION,
+    'interests_visible': INTERESTS,
+    'bio_visible': BIO,
+    'age_visible': AGE,
+    'activities_visible': ACTIVITIES,
+    'availability_visible': AVAILABILITY,
+}
+ALL_VISIBLE = LOCATION | INTERESTS | BIO | AGE | ACTIVITIES | AVAILABILITY
+
+# Always visible to anyone who can see the user at all
+BASE_FIELDS = ('id', 'username', 'profile_picture', 'looking_for')
+# Profile fields gated by a privacy bit for public and friend audiences
+GATED_FIELDS = (
+    ('location', LOCATION),
+    ('age', AGE),
+    ('interests', INTERESTS),
+    ('activities', ACTIVITIES),
+    ('availability', AVAILABILITY),
+    ('bio', BIO),
+)
+# Only friends see where someone is and when they were last around, and only if location is shared
+FRIEND_FIELDS = (('latitude', LOCATION), ('longitude', LOCATION), ('last_active', LOCATION))
+SELF_ONLY_FIELDS = ('email', 'unread_notifications')
+ALL_FIELDS = BASE_FIELDS + tuple(name for name, bit in GATED_FIELDS + FRIEND_FIELDS) + SELF_ONLY_FIELDS
+
+# Narrower projections for payloads that only need a few columns (and only load those)
+CARD_FIELDS = BASE_FIELDS + ('location', 'age', 'interests', 'activities', 'availability')
+MAP_FIELDS = ('id', 'username', 'profile_picture', 'latitude', 'longitude', 'last_active')
+
+_field_lists = {}
+
+
+def compile_privacy(settings):
+    """privacy_settings dict -> bitmask; missing keys default to visible like the old .get(..., True)"""
+    settings = settings or {}
+    mask = 0
+    for key, bit in PRIVACY_BITS.items():
+        if settings.get(key, True):
+            mask |= bit
+    return mask
+
+
+def fields_for(audience, mask, wanted=ALL_FIELDS):
+    """Names among wanted that audience may see for a user with this mask"""
+    key = (audience, mask, wanted)
+    fields = _field_lists.get(key)
+    if fields is None:
+        if audience == SELF:
+            visible = set(ALL_FIELDS)
+        else:
+            gated = GATED_FIELDS + FRIEND_FIELDS if audience == FRIEND else GATED_FIELDS
+            visible = set(BASE_FIELDS) | {name for name, bit in gated if mask & bit}
+        fields = tuple(name for name in wanted if name in visible)
+        _field_lists[key] = fields
+    return fields
+
+
+class UserView:
+    """The fields of one user visible to one audience"""
+    __slots__ = ('fields', 'values')
+
+    def __init__(self, fields, values):
+        self.fields = fields
+        self.values = values
+
+    def __getitem__(self, name):
+        try:
+            return self.values[self.fields.index(name)]
+        except ValueError:
+            raise KeyError(name) from None
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def as_dict(self):
+        return dict(zip(self.fields, self.values))
+
+
+def project(user, audience, fields=ALL_FIELDS):
+    """UserView of user for audience (PUBLIC, FRIEND or SELF), limited to fields"""
+    mask = user.privacy_mask
+    fields = fields_for(audience, ALL_VISIBLE if mask is None else mask, fields)
+    return UserView(fields, tuple(getattr(user, name) for name in fields))
+
+
+def _default(value):
+    if isinstance(value, UserView):
+        return value.as_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(value):
+        """Encode to JSON bytes; datetimes come out in ISO 8601"""
+        return orjson.dumps(value, default=_default)
+
+    loads = orjson.loads
+else:
+    def _default_with_dates(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return _default(value)
+
+    def dumps(value):
+        """Encode to JSON bytes; datetimes come out in ISO 8601"""
+        return json.dumps(value, default=_default_with_dates, separators=(',', ':')).encode()
+
+    loads = json.loads
+
+
+def json_response(value, status=200):
+    return Response(dumps(value), status=status, mimetype='application/json')
+
+
+def init_app(app):
+    app.jinja_env.globals.update(project=project, CARD_FIELDS=CARD_FIELDS)
+
+
+class SocketJSON:
+    """json-module stand-in handed to Flask-SocketIO so event payloads use the same encoder"""
+
+    @staticmethod
+    def dumps(value, *args, **kwargs):
+        return dumps(value).decode()
+
+    @staticmethod
+    def loads(value, *args, **kwargs):
+        return loads(value)
@@ -0,0 +1,134 @@
+import re
+import time
+import logging
+import functools
+from collections import Counter
+from flask import g, request, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Collapse expanded IN lists / VALUES tuples so "IN (?, ?, ?)" and "IN (?)" share a shape
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class SQLBudgetExceeded(RuntimeError):
+    pass
+
+
+class QueryStats:
+    """Queries issued while handling one HTTP request or Socket.IO event"""
+    __slots__ = ('label', 'count', 'db_time', 'shapes')
+
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        """Statement shapes run at least threshold times, most frequent first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def header_value(self):
+        repeated = sum(1 for n in self.shapes.values() if n > 1)
+        return f"queries={self.count}; db_ms={self.db_time * 1000:.1f}; repeated_shapes={repeated}"
+
+
+def statement_shape(statement):
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement)).strip()
+
+
+def current_stats():
+    if has_app_context():
+        return g.get('sql_stats')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start_time'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    timers = exception_context.connection.info.get('query_start_time') if exception_context.connection else None
+    if timers:
+        timers.pop()
+
+
+def start(label):
+    g.sql_stats = QueryStats(label)
+    return g.sql_stats
+
+
+def finish():
+    """Close out the current stats and enforce the configured budgets"""
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return None
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", stats.label, stats.header_value())
+
+    config = current_app.config
+    problems = []
+    if stats.count > config['SQL_QUERY_BUDGET']:
+        problems.append(f"{stats.count} queries (budget {config['SQL_QUERY_BUDGET']})")
+    for shape, n in stats.repeated(config['SQL_REPEAT_BUDGET']):
+        problems.append(f"possible N+1, {n}x: {shape[:200]}")
+
+    if problems:
+        message = f"SQL budget exceeded in {stats.label}: " + " | ".join(problems)
+        if config['SQL_BUDGET_MODE'] == 'raise':
+            raise SQLBudgetExceeded(message)
+        logger.warning(message)
+    return stats
+
+
+def track_event(name):
+    """Decorator collecting query stats for one Socket.IO event handler"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            start(f"socket:{name}")
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                finish()
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    if app.config['SQL_DEBUG_HEADER'] is None:
+        app.config['SQL_DEBUG_HEADER'] = app.debug
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_request_stats():
+        start(f"{request.method} {request.endpoint or request.path}")
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = finish()
+        if stats is not None and app.config['SQL_DEBUG_HEADER']:
+            response.headers['X-SQL-Stats'] = stats.header_value()
+        return response
@@ -0,0 +1,45 @@
+// Socket.IO connection that resumes the user's message stream after a dropped connection.
+// The cursor is the highest direct and group message ids seen, sent on every (re)connect so
+// the server can replay the gap; onResync runs when the gap was too large to replay.
+// The replay repeats a few ids behind the cursor and can overlap live events, so
+// new_message / group_message handlers registered on the returned socket see each id once.
+const DELIVERY_EVENTS = ['new_message', 'group_message'];
+const DELIVERY_SEEN_IDS = 1000;
+
+function deliverySocket(onResync) {
+    let cursor = null;
+    const socket = io({
+        auth: (send) => send(cursor ? { cursor: cursor.join(':') } : {})
+    });
+
+    socket.on('delivery_cursor', (data) => {
+        cursor = data.cursor.split(':').map(Number);
+        if (data.resync && onResync) onResync();
+    });
+
+    const handlers = {};
+    DELIVERY_EVENTS.forEach((event, index) => {
+        const seen = new Set();
+        handlers[event] = [];
+        socket.on(event, (data) => {
+            if (seen.has(data.id)) return;
+            seen.add(data.id);
+            // Sets iterate in insertion order, so this forgets the oldest id
+            if (seen.size > DELIVERY_SEEN_IDS) seen.delete(seen.values().next().value);
+            if (cursor) cursor[index] = Math.max(cursor[index], data.id);
+            handlers[event].forEach((handler) => handler(data));
+        });
+    });
+    const on = socket.on.bind(socket);
+    socket.on = (event, handler) => {
+        if (!(event in handlers)) return on(event, handler);
+        handlers[event].push(handler);
+        return socket;
+    };
+
+    // Sent instead of handling an event when this client is over its rate limit
+    socket.on('slow_down', (data) => {
+        console.warn(`${data.event} rate limited, retry in ${data.retry_after}s`);
+    });
+    return socket;
+}
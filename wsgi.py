@@ -0,0 +1,15 @@
+"""Production WSGI entry point, served by gunicorn (see gunicorn.conf.py)"""
+import os
+
+# The app is preloaded in the gunicorn master, so patch before anything imports threading/socket
+async_mode = os.environ.get('SOCKETIO_ASYNC_MODE')
+if async_mode == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from app import create_app  # noqa: E402
+
+app = create_app()